@@ -0,0 +1,21 @@
+import asyncio
+import logging
+import os
+
+from dinesafe.data.parsed import download_dinesafeto, get_latest_dinesafeto_xml
+from dinesafe.dataset import DatasetStore, load_dataset
+from dinesafe.service import serve
+
+logging.basicConfig(level=logging.INFO)
+
+API_HOST = os.getenv("DINESAFE_API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("DINESAFE_API_PORT", "8000"))
+SHARED_DATASET = os.getenv("DINESAFE_SHARED_DATASET", "true").lower() == "true"
+
+
+if __name__ == "__main__":
+    path_to_xml = get_latest_dinesafeto_xml()
+    if path_to_xml is None:
+        path_to_xml = download_dinesafeto()
+    dataset_store = DatasetStore(load_dataset(path_to_xml, shared=SHARED_DATASET))
+    asyncio.run(serve(dataset_store=dataset_store, host=API_HOST, port=API_PORT))
@@ -1,37 +1,23 @@
 import logging
-from typing import Dict
+import os
+from datetime import datetime
 
-import requests_cache
 import streamlit as st
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.interval import IntervalTrigger
 from streamlit_js_eval import get_geolocation
 
-from dinesafe.data.parsed import (
-    download_dinesafeto,
-    get_establishments_from_xml,
-    get_latest_dinesafeto_xml,
-)
-from dinesafe.data.types import Establishment
+from dinesafe.constants import DEFAULT_LAT_LON
+from dinesafe.data.history import compact_history
+from dinesafe.data.parsed import download_dinesafeto, get_latest_dinesafeto_xml
+from dinesafe.data.types import to_epoch_day
+from dinesafe.dataset import DatasetStore, load_dataset
 from dinesafe.distances.geo import Coords, parse_geolocation
-from dinesafe.search import get_relevant_establishments
+from dinesafe.filters import EstablishmentFilter
+from dinesafe.metrics import METRICS_ENABLED, Breakdown, write_prometheus
+from dinesafe.search import SearchCache
+from dinesafe.yelp_prefetch import warm_yelp_cache
 from views.map_results import map_results
 from views.search_results import search_results
 
-scheduler = BackgroundScheduler()
-scheduler.start()
-
-
-requests_cache.install_cache(
-    name="yelp_api_cache",
-    backend="sqlite",
-    urls_expire_after={
-        "*": 0,
-        # 1 day
-        "api.yelp.com": 86400,
-    },
-)
-
 logger = logging.getLogger(__name__)
 
 
@@ -41,6 +27,11 @@ with open("google_analytics_tag.html") as f:
 
 SHOW_TOP_N_RELEVANT = 25
 REFRESH_HOURS = 12
+# memory map the dataset so that server processes on the same host share one copy
+SHARED_DATASET = os.getenv("DINESAFE_SHARED_DATASET", "true").lower() == "true"
+# for node_exporter's textfile collector, needs DINESAFE_METRICS=true
+METRICS_FILE = os.getenv("DINESAFE_METRICS_FILE", None)
+METRICS_FILE_SECONDS = 60
 
 st.markdown(
     """ # DinesafeTO
@@ -50,45 +41,82 @@ Github: [tianle91/dinesafe](https://github.com/tianle91/dinesafe)
 )
 
 
-@st.cache_resource(ttl=REFRESH_HOURS * 60 * 60)
-def get_all_establishments() -> Dict[str, Establishment]:
-    # get establishments and refresh scheduler
+def download_and_refresh(dataset_store: DatasetStore):
+    download_dinesafeto()
+    dataset_store.refresh(get_latest_dinesafeto_xml())
+    compact_history(download_directory="data/dinesafe")
+
+
+def prefetch_yelp(dataset_store: DatasetStore):
+    warm_yelp_cache(dataset=dataset_store.dataset)
+
+
+@st.cache_resource
+def get_dataset_store() -> DatasetStore:
+    # loaded once, then refreshed in the background after each download
     dinesafe_xml_path = get_latest_dinesafeto_xml()
     if dinesafe_xml_path is None:
         download_dinesafeto()
         dinesafe_xml_path = get_latest_dinesafeto_xml()
     if dinesafe_xml_path is None:
         raise ValueError("Unable to find a dinesafeto xml file")
+    dataset_store = DatasetStore(load_dataset(dinesafe_xml_path, shared=SHARED_DATASET))
+
+    # only needed once per process, rather than imported and started on every rerun
+    from apscheduler.schedulers.background import BackgroundScheduler
+    from apscheduler.triggers.interval import IntervalTrigger
+
+    scheduler = BackgroundScheduler()
+    scheduler.start()
     scheduler.add_job(
-        func=download_dinesafeto,
-        trigger=IntervalTrigger(hours=12),
+        func=download_and_refresh,
+        kwargs={"dataset_store": dataset_store},
+        trigger=IntervalTrigger(hours=REFRESH_HOURS),
         # the following 3 options should make this add_job idempotent
         replace_existing=False,
         max_instances=1,
         id="download_dinesafeto",
     )
-    return get_establishments_from_xml(dinesafe_xml_path)
-
+    scheduler.add_job(
+        func=prefetch_yelp,
+        kwargs={"dataset_store": dataset_store},
+        trigger=IntervalTrigger(hours=REFRESH_HOURS),
+        # warm up right away, not only after the first interval
+        next_run_time=datetime.now(),
+        replace_existing=False,
+        max_instances=1,
+        id="prefetch_yelp",
+    )
+    if METRICS_ENABLED and METRICS_FILE is not None:
+        scheduler.add_job(
+            func=write_prometheus,
+            kwargs={"path": METRICS_FILE},
+            trigger=IntervalTrigger(seconds=METRICS_FILE_SECONDS),
+            replace_existing=False,
+            max_instances=1,
+            id="write_prometheus",
+        )
+    return dataset_store
 
-establishments = get_all_establishments()
 
+dataset = get_dataset_store().dataset
+establishments = dataset.establishments
 
-@st.cache_resource(ttl=REFRESH_HOURS * 60 * 60)
-def get_failed_establishments():
-    return [e for e in establishments.values() if not e.passed_most_recent_inspection]
 
+@st.cache_resource
+def get_search_cache() -> SearchCache:
+    # shared by every session, cleared whenever the dataset version changes
+    return SearchCache()
 
-failed_establishments = get_failed_establishments()
 
+# counts straight from the filter index, which is built once per load
+filter_index = dataset.index.filter_index
 st.write(
     f"Loaded {len(establishments)} establishments "
-    f"with {len(failed_establishments)} failed inspections."
+    f"with {len(filter_index.failed_rows)} failed inspections."
 )
 
 
-# toronto union station
-DEFAULT_LAT_LON = 43.6453, -79.3806
-
 # get search parameters from url or input
 EXISTING_QUERY_PARAMS = st.experimental_get_query_params()
 search_term_default = EXISTING_QUERY_PARAMS.get("search_term", [""])[0]
@@ -111,32 +139,109 @@ if st.checkbox("Near me"):
 if geo_d is None:
     st.warning("No location provided, using defaults.")
 
+radius_km = st.selectbox(
+    label="Distance",
+    options=[None, 1.0, 2.0, 5.0, 10.0],
+    format_func=lambda v: "Any distance" if v is None else f"Within {v:.0f} km",
+)
+
+with st.expander("Filters"):
+    types = st.multiselect(
+        label="Establishment types",
+        options=sorted(filter_index.type_index.rows_by_value),
+    )
+    statuses = st.multiselect(
+        label="Latest inspection status",
+        options=sorted(filter_index.status_index.rows_by_value),
+    )
+    severities = st.multiselect(
+        label="Infraction severities in the latest inspection",
+        options=sorted(filter_index.severity_index.rows_by_value),
+    )
+    failed_only = st.checkbox("Only failed latest inspections")
+    inspected_within_days = st.selectbox(
+        label="Latest inspection",
+        options=[None, 30, 90, 365],
+        format_func=lambda v: "Any time" if v is None else f"Within {v} days",
+    )
+establishment_filter = EstablishmentFilter(
+    latest_statuses=tuple(statuses) if len(statuses) > 0 else None,
+    types=tuple(types) if len(types) > 0 else None,
+    severities=tuple(severities) if len(severities) > 0 else None,
+    failed_only=failed_only,
+    min_latest_day=(
+        to_epoch_day(datetime.now()) - inspected_within_days
+        if inspected_within_days is not None
+        else None
+    ),
+)
+
+# per stage timings of this rerun, shown with ?debug=true
+show_debug = EXISTING_QUERY_PARAMS.get("debug", ["false"])[0].lower() == "true"
+
 st.experimental_set_query_params(
     search_term=search_term,
     latitude=latitude,
     longitude=longitude,
+    # kept, otherwise it's gone from the url as soon as anything changes
+    **({"debug": "true"} if show_debug else {}),
 )
 
 st.info(f"Will search for establishments near: `{latitude}, {longitude}`")
-
-most_relevant = []
-with st.spinner("Getting results..."):
-    coords = None
-    if latitude is not None and longitude is not None:
-        coords = Coords(latitude=latitude, longitude=longitude)
-    most_relevant = get_relevant_establishments(
-        establishments_list=list(establishments.values()),
-        coords=coords,
-        search_term=search_term,
-    )
-if len(most_relevant) == 0:
-    st.warning("No relevant establishments found. Please retry later.")
-else:
-    most_relevant = most_relevant[:SHOW_TOP_N_RELEVANT]
-    st.markdown(f"Showing top {SHOW_TOP_N_RELEVANT} relevant establishments.")
-
-map_results(
-    most_relevant=most_relevant,
-    center_loc=(latitude, longitude),
-)
-search_results(most_relevant=most_relevant)
+show_all_failed = st.checkbox("Show all failed inspections on the map")
+
+with Breakdown("app.rerun", enabled=show_debug or METRICS_ENABLED) as breakdown:
+    most_relevant = []
+    with st.spinner("Getting results..."):
+        coords = None
+        if latitude is not None and longitude is not None:
+            coords = Coords(latitude=latitude, longitude=longitude)
+        most_relevant = get_search_cache().get_relevant_establishments(
+            dataset=dataset,
+            coords=coords,
+            search_term=search_term,
+            limit=SHOW_TOP_N_RELEVANT,
+            radius_km=radius_km,
+            establishment_filter=(
+                establishment_filter
+                if establishment_filter != EstablishmentFilter()
+                else None
+            ),
+        )
+    if len(most_relevant) == 0:
+        st.warning("No relevant establishments found. Please retry later.")
+    else:
+        st.markdown(f"Showing top {SHOW_TOP_N_RELEVANT} relevant establishments.")
+
+    if show_all_failed:
+        # every failed inspection, clustered, rather than only the top results
+        map_results(
+            dataset=dataset,
+            rows=dataset.index.get_failed_rows(),
+            center_loc=(latitude, longitude),
+            n_limit_bounds=None,
+            cluster=True,
+        )
+    else:
+        rows_by_id = dataset.index.rows_by_id
+        map_results(
+            dataset=dataset,
+            rows=[rows_by_id[e.id] for e in most_relevant if e.id in rows_by_id],
+            center_loc=(latitude, longitude),
+        )
+    search_results(most_relevant=most_relevant)
+
+if show_debug:
+    with st.expander("Debug", expanded=True):
+        st.markdown(f"Rerun took {1000 * breakdown.total_seconds:.1f}ms.")
+        st.table(
+            [
+                {
+                    "stage": stage,
+                    "count": stats.count,
+                    "total ms": round(1000 * stats.total_seconds, 1),
+                    "max ms": round(1000 * stats.max_seconds, 1),
+                }
+                for stage, stats in breakdown.get_totals().items()
+            ]
+        )
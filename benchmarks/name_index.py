@@ -0,0 +1,77 @@
+# Compare name search through NameIndex candidates against a full scan.
+#   python -m benchmarks.name_index [--xml data/dinesafe/<ts>.xml]
+import argparse
+import time
+from typing import List
+
+import numpy as np
+
+from dinesafe.data.parsed import get_establishments_from_xml
+from dinesafe.distances.name import (
+    build_name_index,
+    get_name_distances,
+    get_processed_names,
+)
+
+WORDS = [
+    "pizza", "sushi", "cafe", "restaurant", "bar", "grill", "kitchen", "bakery",
+    "tim", "hortons", "india", "thai", "noodle", "house", "king", "golden",
+    "dragon", "express", "market", "food", "the", "coffee", "deli", "burger",
+]  # fmt: skip
+
+QUERIES = ["a", "tim hortons", "pizza", "piza pizza", "golden dragon", "sushi bar"]
+
+
+def get_synthetic_names(n: int, seed: int = 0) -> List[str]:
+    rng = np.random.default_rng(seed)
+    return [
+        " ".join(rng.choice(WORDS, size=rng.integers(1, 4))) + f" #{i}"
+        for i in range(n)
+    ]
+
+
+def get_latency_ms(f, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        f()
+    return 1000 * (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--xml", default=None, help="defaults to synthetic names")
+    parser.add_argument("--n", type=int, default=17000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.xml is not None:
+        names = [e.name for e in get_establishments_from_xml(args.xml).values()]
+    else:
+        names = get_synthetic_names(args.n)
+    processed_names = get_processed_names(names)
+    name_index = build_name_index(processed_names)
+    print(f"{len(names)} names")
+
+    print(f"{'query':<16}{'full ms':>10}{'candidates':>12}{'indexed ms':>12}")
+    for query in QUERIES:
+        full_ms = get_latency_ms(
+            lambda: get_name_distances(query, processed_names, processed=True),
+            repeat=args.repeat,
+        )
+
+        def indexed():
+            rows = name_index.get_candidate_rows(query)
+            if rows is None:
+                return get_name_distances(query, processed_names, processed=True)
+            return get_name_distances(
+                query, [processed_names[i] for i in rows], processed=True
+            )
+
+        rows = name_index.get_candidate_rows(query)
+        num_candidates = len(names) if rows is None else len(rows)
+        indexed_ms = get_latency_ms(indexed, repeat=args.repeat)
+        print(f"{query:<16}{full_ms:>10.2f}{num_candidates:>12}{indexed_ms:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
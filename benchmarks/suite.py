@@ -0,0 +1,176 @@
+# Time and measure peak memory of the load, search and render hot paths on synthetic data.
+#   python -m benchmarks.suite [--sizes 10000 100000 1000000] [--output benchmark_results.json]
+import argparse
+import json
+import os
+import platform
+import statistics
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, List
+
+import numpy as np
+
+from benchmarks.synthetic import write_synthetic_xml
+from dinesafe.constants import DEFAULT_LAT_LON
+from dinesafe.data.parsed import get_establishments_from_xml
+from dinesafe.distances import normalize
+from dinesafe.distances.geo import Coords
+from dinesafe.filters import EstablishmentFilter
+from dinesafe.index import build_establishment_index
+from dinesafe.search import get_relevant_establishments
+from views.map_results import get_geojson
+from views.search_results import get_establishment_md, get_inspections_summary_md
+
+SEARCH_LIMIT = 25
+COORDS = Coords(latitude=DEFAULT_LAT_LON[0], longitude=DEFAULT_LAT_LON[1])
+
+
+def measure(name: str, n: int, f: Callable, repeat: int) -> dict:
+    # timings without tracemalloc, which slows everything down, then one traced run for memory
+    durations_ms = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        durations_ms.append(1000 * (time.perf_counter() - start))
+    tracemalloc.start()
+    f()
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result = {
+        "name": name,
+        "n": n,
+        "repeat": repeat,
+        "median_ms": statistics.median(durations_ms),
+        "min_ms": min(durations_ms),
+        "peak_mb": peak_bytes / 2**20,
+    }
+    print(f"{name:<40}{n:>10}{result['median_ms']:>12.2f}{result['peak_mb']:>12.2f}")
+    return result
+
+
+def run_benchmarks(path_to_xml: str, n: int, repeat: int) -> List[dict]:
+    results = [
+        measure(
+            "get_establishments_from_xml",
+            n,
+            lambda: get_establishments_from_xml(path_to_xml, workers=1),
+            repeat=1,
+        )
+    ]
+    if (os.cpu_count() or 1) > 1:
+        results.append(
+            measure(
+                "get_establishments_from_xml_parallel",
+                n,
+                lambda: get_establishments_from_xml(path_to_xml),
+                repeat=1,
+            )
+        )
+    establishments = get_establishments_from_xml(path_to_xml)
+    results.append(
+        measure(
+            "build_establishment_index",
+            n,
+            lambda: build_establishment_index(establishments.values()),
+            repeat=1,
+        )
+    )
+    index = build_establishment_index(establishments.values())
+
+    searches = {
+        "search_name_only": dict(search_term="golden dragon"),
+        "search_geo_only": dict(coords=COORDS),
+        "search_combined": dict(search_term="pizza", coords=COORDS),
+        "search_combined_radius": dict(search_term="pizza", coords=COORDS, radius_km=2),
+        "search_failed_recently_nearby": dict(
+            coords=COORDS,
+            radius_km=2,
+            establishment_filter=EstablishmentFilter(
+                failed_only=True, min_latest_day=int(index.latest_days.max()) - 30
+            ),
+        ),
+    }
+    for name, kwargs in searches.items():
+        results.append(
+            measure(
+                name,
+                n,
+                lambda: get_relevant_establishments(
+                    index=index, limit=SEARCH_LIMIT, **kwargs
+                ),
+                repeat=repeat,
+            )
+        )
+
+    distances = np.random.default_rng(0).uniform(size=n)
+    results.append(
+        measure("normalize", n, lambda: normalize(arr=distances), repeat=repeat)
+    )
+
+    most_relevant = get_relevant_establishments(
+        index=index, search_term="pizza", coords=COORDS, limit=SEARCH_LIMIT
+    )
+    top_rows = [index.rows_by_id[e.id] for e in most_relevant]
+
+    def prepare_views(rows):
+        get_geojson(index, rows)
+        for i, e in enumerate(index.get_establishments(rows)):
+            get_establishment_md(rank=i + 1, establishment=e)
+            get_inspections_summary_md(e.summary)
+
+    results.append(
+        measure(
+            "prepare_views_top_results",
+            n,
+            lambda: prepare_views(top_rows),
+            repeat=repeat,
+        )
+    )
+    # the clustered map of every failed inspection, without the listing
+    results.append(
+        measure(
+            "prepare_map_all_failed",
+            n,
+            lambda: get_geojson(index, index.get_failed_rows(), ranked=False),
+            repeat=repeat,
+        )
+    )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--data-dir", default=os.path.join("data", "synthetic"))
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args()
+
+    print(f"{'benchmark':<40}{'n':>10}{'median ms':>12}{'peak mb':>12}")
+    results = []
+    for n in args.sizes:
+        # generated once per size and reused across runs
+        path_to_xml = os.path.join(args.data_dir, f"{n}.xml")
+        if not os.path.isfile(path_to_xml):
+            write_synthetic_xml(path_to_xml, n=n)
+        results += run_benchmarks(path_to_xml, n=n, repeat=args.repeat)
+
+    with open(args.output, "w") as f:
+        json.dump(
+            {
+                "created_at": datetime.now().isoformat(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# Write DineSafe-schema XML with n synthetic establishments around Toronto.
+#   python -m benchmarks.synthetic --n 100000 --output data/synthetic/100000.xml
+import argparse
+import os
+from datetime import date, timedelta
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+from benchmarks.name_index import get_synthetic_names
+
+TYPES = ["Restaurant", "Food Take Out", "Bakery", "Food Court Vendor", "Supermarket"]
+STATUSES = ["Pass", "Pass", "Pass", "Conditional Pass", "Closed"]
+SEVERITIES = ["M - Minor", "S - Significant", "C - Crucial", "NA - Not Applicable"]
+DEFICIENCIES = [
+    "Fail to protect against entry of pests - Sec. 13(1)",
+    "Operate food premise - equipment not constructed to permit cleaning - Sec. 9",
+    "Fail to ensure food handler in food premise wears clean outer garments - Sec. 33(1)(a)",
+    "Store potentially hazardous food at internal temperature over 4C - Sec. 27(1)",
+]
+ACTIONS = ["Notice to Comply", "Corrected During Inspection", "Ticket", "Closed"]
+# roughly the city's bounding box
+LATITUDES = (43.58, 43.85)
+LONGITUDES = (-79.64, -79.12)
+FIRST_DAY = date(2019, 1, 1)
+
+
+def get_leaf(tag: str, v) -> str:
+    return f"<{tag}>{escape(str(v)) if v is not None else ''}</{tag}>"
+
+
+def write_synthetic_xml(path: str, n: int, seed: int = 0) -> str:
+    rng = np.random.default_rng(seed)
+    names = get_synthetic_names(n, seed=seed)
+    latitudes = rng.uniform(*LATITUDES, size=n)
+    longitudes = rng.uniform(*LONGITUDES, size=n)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?><DINESAFE_DATA>')
+        for i in range(n):
+            status = STATUSES[rng.integers(len(STATUSES))]
+            parts = [
+                "<ESTABLISHMENT>",
+                get_leaf("ID", 10000000 + i),
+                get_leaf("NAME", names[i]),
+                get_leaf("TYPE", TYPES[rng.integers(len(TYPES))]),
+                get_leaf("ADDRESS", f"{rng.integers(1, 3000)} SYNTHETIC ST"),
+                get_leaf("LATITUDE", f"{latitudes[i]:.5f}"),
+                get_leaf("LONGITUDE", f"{longitudes[i]:.5f}"),
+                get_leaf("STATUS", status),
+            ]
+            for _ in range(rng.integers(1, 6)):
+                day = FIRST_DAY + timedelta(days=int(rng.integers(0, 4 * 365)))
+                parts += [
+                    "<INSPECTION>",
+                    get_leaf("STATUS", STATUSES[rng.integers(len(STATUSES))]),
+                    get_leaf("DATE", day.isoformat()),
+                ]
+                for _ in range(rng.integers(0, 4)):
+                    parts += [
+                        "<INFRACTION>",
+                        get_leaf("SEVERITY", SEVERITIES[rng.integers(len(SEVERITIES))]),
+                        get_leaf(
+                            "DEFICIENCY", DEFICIENCIES[rng.integers(len(DEFICIENCIES))]
+                        ),
+                        get_leaf("ACTION", ACTIONS[rng.integers(len(ACTIONS))]),
+                        get_leaf("CONVICTION_DATE", None),
+                        get_leaf("COURT_OUTCOME", None),
+                        get_leaf("AMOUNT_FINED", None),
+                        "</INFRACTION>",
+                    ]
+                parts.append("</INSPECTION>")
+            parts.append("</ESTABLISHMENT>")
+            f.write("".join(parts))
+        f.write("</DINESAFE_DATA>")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+    output = args.output or os.path.join("data", "synthetic", f"{args.n}.xml")
+    print(write_synthetic_xml(output, n=args.n, seed=args.seed))
+
+
+if __name__ == "__main__":
+    main()
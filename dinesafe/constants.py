@@ -3,3 +3,6 @@ from datetime import date
 YMD_FORMAT = "%Y-%m-%d"
 
 assert date(2022, 4, 29).strftime(YMD_FORMAT) == "2022-04-29"
+
+# toronto union station
+DEFAULT_LAT_LON = 43.6453, -79.3806
@@ -0,0 +1,407 @@
+import json
+import logging
+import os
+import shutil
+from typing import Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from dinesafe.data.parsed import get_establishments_from_xml
+from dinesafe.data.refresh import EstablishmentsDiff
+from dinesafe.data.snapshot import get_file_hash
+from dinesafe.data.types import Establishment, Infraction, Inspection
+
+logger = logging.getLogger(__name__)
+
+# bump this whenever the columns change
+COLUMNAR_SCHEMA_VERSION = 1
+META_FNAME = "meta.json"
+# stand ins for None in integer and categorical columns
+MISSING_DAY = np.iinfo(np.int32).min
+MISSING_CODE = -1
+
+ESTABLISHMENT_STRINGS = ["id", "name", "address"]
+CATEGORICALS = ["type", "status", "severity", "deficiency", "action", "court_outcome"]
+
+
+def get_columnar_path(path_to_xml: str) -> str:
+    return f"{path_to_xml}.columnar"
+
+
+class StringColumn:
+    # utf-8 bytes of every string back to back, and where each one starts
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return self.data[self.offsets[i] : self.offsets[i + 1]].tobytes().decode()
+
+    def to_list(self) -> List[str]:
+        data = self.data.tobytes()
+        offsets = self.offsets.tolist()
+        return [data[offsets[i] : offsets[i + 1]].decode() for i in range(len(self))]
+
+
+def get_string_arrays(strings: List[str]) -> Dict[str, np.ndarray]:
+    encoded = [s.encode() for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return {
+        "data": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+        "offsets": offsets,
+    }
+
+
+class Categories:
+    # so that codes can be assigned while writing columns
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+
+    def get_code(self, v: Optional[str]) -> int:
+        if v is None:
+            return MISSING_CODE
+        return self.codes.setdefault(v, len(self.codes))
+
+    def to_list(self) -> List[str]:
+        return list(self.codes)
+
+
+def write_columnar(
+    establishments: Mapping[str, Establishment], path: str, xml_hash: str
+) -> str:
+    categories = {k: Categories() for k in CATEGORICALS}
+    columns: Dict[str, list] = {
+        k: []
+        for k in [
+            "latitude",
+            "longitude",
+            "type",
+            "status",
+            "inspection_offsets",
+            "inspection_status",
+            "inspection_day",
+            "infraction_offsets",
+            "severity",
+            "deficiency",
+            "action",
+            "court_outcome",
+            "conviction_day",
+            "amount_fined",
+        ]
+    }
+    strings: Dict[str, List[str]] = {k: [] for k in ESTABLISHMENT_STRINGS}
+    columns["inspection_offsets"].append(0)
+    columns["infraction_offsets"].append(0)
+    for e in establishments.values():
+        strings["id"].append(e.id)
+        strings["name"].append(e.name)
+        strings["address"].append(e.address)
+        columns["latitude"].append(e.latitude)
+        columns["longitude"].append(e.longitude)
+        columns["type"].append(categories["type"].get_code(e.type))
+        columns["status"].append(categories["status"].get_code(e.status))
+        for inspection in e.inspections:
+            columns["inspection_status"].append(
+                categories["status"].get_code(inspection.status)
+            )
+            columns["inspection_day"].append(inspection.day)
+            for infraction in inspection.infractions:
+                for k in ["severity", "deficiency", "action", "court_outcome"]:
+                    columns[k].append(categories[k].get_code(getattr(infraction, k)))
+                columns["conviction_day"].append(
+                    infraction.conviction_day
+                    if infraction.conviction_day is not None
+                    else MISSING_DAY
+                )
+                columns["amount_fined"].append(
+                    infraction.amount_fined
+                    if infraction.amount_fined is not None
+                    else np.nan
+                )
+            columns["infraction_offsets"].append(len(columns["severity"]))
+        columns["inspection_offsets"].append(len(columns["inspection_day"]))
+
+    dtypes = {
+        "latitude": np.float64,
+        "longitude": np.float64,
+        "inspection_offsets": np.int64,
+        "inspection_day": np.int32,
+        "infraction_offsets": np.int64,
+        "conviction_day": np.int32,
+        "amount_fined": np.float64,
+    }
+    arrays = {k: np.array(v, dtype=dtypes.get(k, np.int32)) for k, v in columns.items()}
+    for k, v in strings.items():
+        for suffix, arr in get_string_arrays(v).items():
+            arrays[f"{k}_{suffix}"] = arr
+
+    # written elsewhere and renamed into place, so readers only ever see a complete copy
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    for k, arr in arrays.items():
+        np.save(os.path.join(tmp_path, f"{k}.npy"), arr)
+    with open(os.path.join(tmp_path, META_FNAME), "w") as f:
+        json.dump(
+            {
+                "schema_version": COLUMNAR_SCHEMA_VERSION,
+                "xml_hash": xml_hash,
+                "categories": {k: v.to_list() for k, v in categories.items()},
+            },
+            f,
+        )
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # someone else got there first, or there's a stale copy to replace
+        stale_path = f"{path}.{os.getpid()}.stale"
+        if os.path.isdir(path):
+            os.rename(path, stale_path)
+        os.rename(tmp_path, path)
+        shutil.rmtree(stale_path, ignore_errors=True)
+    return path
+
+
+class ColumnarEstablishments(Mapping[str, Establishment]):
+    # read only view over memory mapped columns, establishments are only built on access
+    def __init__(self, path: str):
+        with open(os.path.join(path, META_FNAME)) as f:
+            self.meta = json.load(f)
+        self.categories = self.meta["categories"]
+        self.columns = {
+            fname[: -len(".npy")]: np.load(os.path.join(path, fname), mmap_mode="r")
+            for fname in os.listdir(path)
+            if fname.endswith(".npy")
+        }
+        self.strings = {
+            k: StringColumn(self.columns[f"{k}_data"], self.columns[f"{k}_offsets"])
+            for k in ESTABLISHMENT_STRINGS
+        }
+        self.ids = self.strings["id"].to_list()
+        self.rows_by_id = {k: i for i, k in enumerate(self.ids)}
+
+    def __getitem__(self, k: str) -> Establishment:
+        return self.get_establishment(self.rows_by_id[k])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.ids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, k) -> bool:
+        return k in self.rows_by_id
+
+    def get_category(self, k: str, code: int) -> Optional[str]:
+        return self.categories[k][code] if code != MISSING_CODE else None
+
+    def get_infraction(self, i: int) -> Infraction:
+        c = self.columns
+        conviction_day = int(c["conviction_day"][i])
+        amount_fined = float(c["amount_fined"][i])
+        return Infraction(
+            severity=self.get_category("severity", c["severity"][i]),
+            deficiency=self.get_category("deficiency", c["deficiency"][i]),
+            action=self.get_category("action", c["action"][i]),
+            conviction_day=conviction_day if conviction_day != MISSING_DAY else None,
+            court_outcome=self.get_category("court_outcome", c["court_outcome"][i]),
+            amount_fined=amount_fined if not np.isnan(amount_fined) else None,
+        )
+
+    def get_inspection(self, i: int) -> Inspection:
+        c = self.columns
+        start, stop = c["infraction_offsets"][i], c["infraction_offsets"][i + 1]
+        return Inspection(
+            status=self.get_category("status", c["inspection_status"][i]),
+            day=int(c["inspection_day"][i]),
+            infractions=tuple(self.get_infraction(j) for j in range(start, stop)),
+        )
+
+    def get_establishment(self, row: int) -> Establishment:
+        c = self.columns
+        start, stop = c["inspection_offsets"][row], c["inspection_offsets"][row + 1]
+        return Establishment(
+            id=self.ids[row],
+            name=self.strings["name"][row],
+            type=self.get_category("type", c["type"][row]),
+            address=self.strings["address"][row],
+            latitude=float(c["latitude"][row]),
+            longitude=float(c["longitude"][row]),
+            status=self.get_category("status", c["status"][row]),
+            inspections=tuple(self.get_inspection(j) for j in range(start, stop)),
+        )
+
+    def get_categories(self, k: str, codes: np.ndarray) -> np.ndarray:
+        # MISSING_CODE is -1, which picks the None at the end
+        return np.array(self.categories[k] + [None], dtype=object)[codes]
+
+    def get_types(self) -> np.ndarray:
+        return self.get_categories("type", np.asarray(self.columns["type"]))
+
+    def get_latest_inspections(self) -> np.ndarray:
+        # first, i.e. latest, inspection of each row, or -1 if there are none
+        offsets = self.columns["inspection_offsets"]
+        return np.where(offsets[1:] > offsets[:-1], offsets[:-1], -1)
+
+    def get_latest_statuses(self) -> np.ndarray:
+        latest = self.get_latest_inspections()
+        statuses = np.full(len(self), None, dtype=object)
+        statuses[latest >= 0] = self.get_categories(
+            "status", np.asarray(self.columns["inspection_status"])[latest[latest >= 0]]
+        )
+        return statuses
+
+    def get_latest_days(self) -> np.ndarray:
+        latest = self.get_latest_inspections()
+        days = np.full(len(self), MISSING_DAY, dtype=np.int32)
+        days[latest >= 0] = np.asarray(self.columns["inspection_day"])[
+            latest[latest >= 0]
+        ]
+        return days
+
+    def get_latest_severities(self) -> List[Tuple[str, ...]]:
+        # distinct severities of infractions in the latest inspection of each row
+        latest = self.get_latest_inspections()
+        infraction_offsets = self.columns["infraction_offsets"]
+        severities = self.get_categories(
+            "severity", np.asarray(self.columns["severity"])
+        )
+        latest_severities = []
+        for i in latest:
+            if i < 0:
+                latest_severities.append(())
+                continue
+            start, end = infraction_offsets[i], infraction_offsets[i + 1]
+            latest_severities.append(
+                tuple(sorted({v for v in severities[start:end] if v is not None}))
+            )
+        return latest_severities
+
+
+class ColumnarRows(Sequence[Establishment]):
+    # establishments by row, as EstablishmentIndex wants them
+    def __init__(self, establishments: ColumnarEstablishments):
+        self.establishments = establishments
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(len(self)))]
+        return self.establishments.get_establishment(int(row))
+
+    def __len__(self) -> int:
+        return len(self.establishments)
+
+
+def load_columnar(path_to_xml: str) -> Optional[ColumnarEstablishments]:
+    path = get_columnar_path(path_to_xml)
+    if not os.path.isdir(path):
+        return None
+    try:
+        establishments = ColumnarEstablishments(path)
+    except Exception as e:
+        logger.error(f"Failed to load columnar snapshot {path}: {e}")
+        return None
+    if establishments.meta != {
+        **establishments.meta,
+        "schema_version": COLUMNAR_SCHEMA_VERSION,
+        "xml_hash": get_file_hash(path_to_xml),
+    }:
+        logger.info(f"Ignoring stale columnar snapshot: {path}")
+        return None
+    return establishments
+
+
+def load_columnar_establishments(path_to_xml: str) -> ColumnarEstablishments:
+    # establishments backed by files that every process maps read only
+    establishments = load_columnar(path_to_xml)
+    if establishments is None:
+        logger.info(f"No valid columnar snapshot, parsing {path_to_xml}")
+        write_columnar(
+            establishments=get_establishments_from_xml(path_to_xml),
+            path=get_columnar_path(path_to_xml),
+            xml_hash=get_file_hash(path_to_xml),
+        )
+        establishments = load_columnar(path_to_xml)
+    return establishments
+
+
+def get_inspection_rows(
+    establishments: ColumnarEstablishments, rows: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    # rows of every inspection of each of rows, in order, and how many each has
+    offsets = np.asarray(establishments.columns["inspection_offsets"])
+    starts = offsets[rows]
+    counts = offsets[rows + 1] - starts
+    firsts = np.cumsum(counts) - counts
+    return np.repeat(starts - firsts, counts) + np.arange(counts.sum()), counts
+
+
+def get_columnar_establishments_diff(
+    old: ColumnarEstablishments, new: ColumnarEstablishments
+) -> EstablishmentsDiff:
+    # same as get_establishments_diff, straight from the columns so that only the
+    # added and changed establishments get built, infraction details aren't compared
+    old_rows = []
+    new_rows = []
+    added_rows = []
+    for new_row, k in enumerate(new.ids):
+        old_row = old.rows_by_id.get(k)
+        if old_row is None:
+            added_rows.append(new_row)
+        else:
+            old_rows.append(old_row)
+            new_rows.append(new_row)
+    old_rows = np.array(old_rows, dtype=np.intp)
+    new_rows = np.array(new_rows, dtype=np.intp)
+
+    old_names = old.strings["name"].to_list()
+    new_names = new.strings["name"].to_list()
+    old_addresses = old.strings["address"].to_list()
+    new_addresses = new.strings["address"].to_list()
+    changed = np.array(
+        [
+            old_names[i] != new_names[j] or old_addresses[i] != new_addresses[j]
+            for i, j in zip(old_rows.tolist(), new_rows.tolist())
+        ],
+        dtype=bool,
+    )
+    for k in ["latitude", "longitude"]:
+        changed |= old.columns[k][old_rows] != new.columns[k][new_rows]
+    for k in ["type", "status"]:
+        changed |= old.get_categories(k, old.columns[k][old_rows]) != (
+            new.get_categories(k, new.columns[k][new_rows])
+        )
+
+    old_inspections, old_counts = get_inspection_rows(old, old_rows)
+    new_inspections, new_counts = get_inspection_rows(new, new_rows)
+    changed |= old_counts != new_counts
+    # inspections of establishments that have as many as before, compared in order
+    same_counts = old_counts == new_counts
+    old_inspections = old_inspections[np.repeat(same_counts, old_counts)]
+    new_inspections = new_inspections[np.repeat(same_counts, new_counts)]
+    inspection_changed = (
+        old.columns["inspection_day"][old_inspections]
+        != new.columns["inspection_day"][new_inspections]
+    )
+    inspection_changed |= old.get_categories(
+        "status", old.columns["inspection_status"][old_inspections]
+    ) != new.get_categories("status", new.columns["inspection_status"][new_inspections])
+    old_infraction_offsets = np.asarray(old.columns["infraction_offsets"])
+    new_infraction_offsets = np.asarray(new.columns["infraction_offsets"])
+    inspection_changed |= np.diff(old_infraction_offsets)[old_inspections] != (
+        np.diff(new_infraction_offsets)[new_inspections]
+    )
+    same_count_rows = np.flatnonzero(same_counts)
+    changed[
+        np.repeat(same_count_rows, old_counts[same_count_rows])[inspection_changed]
+    ] = True
+
+    return EstablishmentsDiff(
+        added=[new.get_establishment(i) for i in added_rows],
+        removed=[k for k in old.ids if k not in new.rows_by_id],
+        changed=[new.get_establishment(i) for i in new_rows[changed].tolist()],
+    )
@@ -0,0 +1,43 @@
+import fcntl
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Iterator
+
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    # exclusive across every process (and thread) on the host that locks the same path,
+    # released when the file is closed, which also happens if the process dies
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def get_temp_path(path: str) -> str:
+    # unique, next to path so that os.replace onto it is atomic
+    fd, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path) or ".",
+        prefix=f"{os.path.basename(path)}.",
+        suffix=".tmp",
+    )
+    os.close(fd)
+    return temp_path
+
+
+def write_json(path: str, d: dict, **kwargs):
+    # readers see either the old or the new file, never a partial one
+    temp_path = get_temp_path(path)
+    try:
+        with open(temp_path, "w") as f:
+            json.dump(d, f, **kwargs)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
@@ -0,0 +1,111 @@
+import contextlib
+import json
+import logging
+import os
+import shutil
+import zipfile
+from glob import glob
+from typing import IO, Iterator, List, Optional, Tuple
+
+from dinesafe.data.files import file_lock, get_temp_path, write_json
+
+logger = logging.getLogger(__name__)
+
+# downloads on disk, oldest first, so that the latest doesn't need a glob
+MANIFEST_FNAME = "manifest.json"
+# older downloads are compacted into this
+ARCHIVE_FNAME = "history.zip"
+KEEP_LATEST_N = 4
+# held while the manifest or archive is read and rewritten, by any process
+HISTORY_LOCK_FNAME = "history.lock"
+
+
+def get_manifest(download_directory: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(download_directory, MANIFEST_FNAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_manifest(download_directory: str, manifest: dict):
+    write_json(os.path.join(download_directory, MANIFEST_FNAME), manifest, indent=2)
+
+
+def get_xml_fnames(download_directory: str) -> List[str]:
+    # downloads are named by timestamp, so sorting by name is sorting by time
+    manifest = get_manifest(download_directory)
+    if manifest is not None:
+        return manifest["xmls"]
+    return sorted(
+        os.path.basename(p) for p in glob(os.path.join(download_directory, "*.xml"))
+    )
+
+
+def get_latest_xml(download_directory: str) -> Optional[str]:
+    manifest = get_manifest(download_directory)
+    if manifest is not None and len(manifest["xmls"]) > 0:
+        latest_path = os.path.join(download_directory, manifest["xmls"][-1])
+        if os.path.isfile(latest_path):
+            return latest_path
+        logger.error(f"Ignoring manifest, {latest_path} is missing")
+    xml_paths = sorted(glob(os.path.join(download_directory, "*.xml")), reverse=True)
+    return xml_paths[0] if len(xml_paths) > 0 else None
+
+
+def add_xml(download_directory: str, path: str):
+    with file_lock(os.path.join(download_directory, HISTORY_LOCK_FNAME)):
+        fnames = [
+            f for f in get_xml_fnames(download_directory) if f != os.path.basename(path)
+        ]
+        write_manifest(download_directory, {"xmls": fnames + [os.path.basename(path)]})
+
+
+def compact_history(download_directory: str, keep_latest_n: int = KEEP_LATEST_N):
+    # move all but the latest few downloads into a compressed archive
+    with file_lock(os.path.join(download_directory, HISTORY_LOCK_FNAME)):
+        fnames = get_xml_fnames(download_directory)
+        to_archive = fnames[: max(0, len(fnames) - keep_latest_n)]
+        if len(to_archive) == 0:
+            return
+        archive_path = os.path.join(download_directory, ARCHIVE_FNAME)
+        # appended to a copy, so readers never see a half written archive
+        temp_path = get_temp_path(archive_path)
+        try:
+            if os.path.isfile(archive_path):
+                shutil.copyfile(archive_path, temp_path)
+            with zipfile.ZipFile(temp_path, "a", compression=zipfile.ZIP_LZMA) as z:
+                archived = set(z.namelist())
+                for fname in to_archive:
+                    path = os.path.join(download_directory, fname)
+                    if fname not in archived and os.path.isfile(path):
+                        z.write(path, arcname=fname)
+            os.replace(temp_path, archive_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        write_manifest(download_directory, {"xmls": fnames[len(to_archive) :]})
+        # only removed once safely in the archive and out of the manifest
+        for fname in to_archive:
+            # along with anything derived from it, like snapshots
+            for path in glob(os.path.join(download_directory, f"{fname}*")):
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(path)
+    logger.info(f"Archived {len(to_archive)} downloads into {archive_path}")
+
+
+def iter_history(download_directory: str) -> Iterator[Tuple[str, IO[bytes]]]:
+    # every download so far, oldest first, e.g. for iter_establishments_from_xml
+    archive_path = os.path.join(download_directory, ARCHIVE_FNAME)
+    if os.path.isfile(archive_path):
+        with zipfile.ZipFile(archive_path) as z:
+            for fname in sorted(z.namelist()):
+                with z.open(fname) as f:
+                    yield fname, f
+    for fname in get_xml_fnames(download_directory):
+        with open(os.path.join(download_directory, fname), "rb") as f:
+            yield fname, f
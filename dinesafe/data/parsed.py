@@ -1,15 +1,32 @@
+import contextlib
+import hashlib
+import json
 import logging
+import multiprocessing
 import os
+import sys
 import time
-from datetime import datetime
-from glob import glob
-from typing import Dict, Optional
-
-import wget
-import xmltodict
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import date, datetime
+from functools import lru_cache
+from typing import TYPE_CHECKING, Deque, Dict, Iterator, List, Optional
 
 from dinesafe.constants import YMD_FORMAT
-from dinesafe.data.types import Establishment, Infraction, Inspection
+from dinesafe.data.files import file_lock, write_json
+from dinesafe.data.history import add_xml, get_latest_xml
+from dinesafe.data.types import (
+    EPOCH,
+    Establishment,
+    Infraction,
+    Inspection,
+    get_inspection_summary,
+    to_epoch_day,
+)
+from dinesafe.metrics import timed
+
+if TYPE_CHECKING:
+    from xml.etree import ElementTree
 
 logger = logging.getLogger(__name__)
 
@@ -19,43 +36,202 @@ logger = logging.getLogger(__name__)
 URL = "https://secure.toronto.ca/opendata/ds/od_xml/v2?format=xml&stream=n"
 
 
-def download_dinesafeto(download_directory="data/dinesafe") -> Optional[str]:
-    now_ts = time.time()
-    download_fname = f"{now_ts}.xml"
-    download_path = os.path.join(download_directory, download_fname)
-    logger.info(f"Downloading to {download_path}")
+# http validators and content hash of the last download, next to the downloads
+DOWNLOAD_STATE_FNAME = "download_state.json"
+# not *.xml so that partial downloads are never picked up as the latest
+PARTIAL_DOWNLOAD_FNAME = "download.xml.part"
+# every process on the host downloads into the same directory, one at a time
+DOWNLOAD_LOCK_FNAME = "download.lock"
+
+
+def get_download_state(download_directory: str) -> dict:
     try:
-        wget.download(URL, out=download_path)
-        return download_path
+        with open(os.path.join(download_directory, DOWNLOAD_STATE_FNAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_download_state(download_directory: str, state: dict):
+    write_json(os.path.join(download_directory, DOWNLOAD_STATE_FNAME), state)
+
+
+def get_resume_validator(validators: dict) -> Optional[str]:
+    # If-Range needs a strong etag or a date
+    etag = validators.get("etag")
+    if etag is not None and not etag.startswith("W/"):
+        return etag
+    return validators.get("last_modified")
+
+
+def get_content_range_start(content_range: Optional[str]) -> Optional[int]:
+    # e.g. "bytes 100-199/200", None if it's missing or can't be parsed
+    if content_range is None or not content_range.startswith("bytes "):
+        return None
+    start, _, _ = content_range[len("bytes ") :].partition("-")
+    return int(start) if start.strip().isdigit() else None
+
+
+def download_dinesafeto(
+    download_directory="data/dinesafe",
+    url: str = URL,
+    timeout: float = 60.0,
+    accept_gzip: bool = True,
+) -> Optional[str]:
+    # returns the path holding the latest data, which is the previous download if
+    # nothing changed, or None on failure, waits for any other process's download
+    # first, which then usually makes this one a conditional request that's not modified
+    with file_lock(os.path.join(download_directory, DOWNLOAD_LOCK_FNAME)):
+        return _download_dinesafeto(
+            download_directory=download_directory,
+            url=url,
+            timeout=timeout,
+            accept_gzip=accept_gzip,
+        )
+
+
+def _download_dinesafeto(
+    download_directory: str, url: str, timeout: float, accept_gzip: bool
+) -> Optional[str]:
+    state = get_download_state(download_directory)
+    latest_path = state.get("path")
+    if latest_path is not None and not os.path.isfile(latest_path):
+        latest_path = None
+    partial_path = os.path.join(download_directory, PARTIAL_DOWNLOAD_FNAME)
+
+    headers = {"Accept-Encoding": "gzip" if accept_gzip else "identity"}
+    if latest_path is not None:
+        if state.get("etag") is not None:
+            headers["If-None-Match"] = state["etag"]
+        if state.get("last_modified") is not None:
+            headers["If-Modified-Since"] = state["last_modified"]
+    resume_validator = get_resume_validator(state.get("partial", {}))
+    if resume_validator is not None and os.path.isfile(partial_path):
+        # ranges are over the unencoded bytes already written
+        headers["Accept-Encoding"] = "identity"
+        headers["Range"] = f"bytes={os.path.getsize(partial_path)}-"
+        headers["If-Range"] = resume_validator
+
+    logger.info(f"Downloading {url} with {headers}")
+    # only needed when downloading, which most processes never do
+    import requests
+
+    try:
+        with requests.get(url, headers=headers, stream=True, timeout=timeout) as r:
+            if r.status_code == 304:
+                logger.info(f"Not modified since {latest_path}")
+                return latest_path
+            r.raise_for_status()
+
+            validators = {
+                "etag": r.headers.get("ETag"),
+                "last_modified": r.headers.get("Last-Modified"),
+            }
+            content_hash = hashlib.sha256()
+            restart = False
+            if r.status_code == 206:
+                # only appended if it picks up exactly where the partial file ends
+                partial_size = os.path.getsize(partial_path)
+                content_range = r.headers.get("Content-Range")
+                restart = get_content_range_start(content_range) != partial_size
+                if restart:
+                    logger.warning(
+                        f"Expected a range from {partial_size}, got {content_range}"
+                    )
+                else:
+                    with open(partial_path, "rb") as f:
+                        for chunk in iter(lambda: f.read(1 << 20), b""):
+                            content_hash.update(chunk)
+                    mode = "ab"
+            else:
+                mode = "wb"
+                # so that an interrupted download can be resumed next time
+                write_download_state(
+                    download_directory, {**state, "partial": validators}
+                )
+            if not restart:
+                with open(partial_path, mode) as f:
+                    for chunk in r.iter_content(chunk_size=1 << 20):
+                        f.write(chunk)
+                        content_hash.update(chunk)
     except Exception as e:
         logger.error(str(e))
-    return None
+        return None
+
+    if restart:
+        # without the partial file there's no range to ask for the second time around
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(partial_path)
+        write_download_state(
+            download_directory, {k: v for k, v in state.items() if k != "partial"}
+        )
+        return _download_dinesafeto(
+            download_directory=download_directory,
+            url=url,
+            timeout=timeout,
+            accept_gzip=accept_gzip,
+        )
+
+    state = {**validators, "path": latest_path, "sha256": state.get("sha256")}
+    if latest_path is not None and content_hash.hexdigest() == state["sha256"]:
+        logger.info(f"Downloaded content is the same as {latest_path}")
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(partial_path)
+    else:
+        download_path = os.path.join(download_directory, f"{time.time()}.xml")
+        try:
+            os.replace(partial_path, download_path)
+        except FileNotFoundError:
+            # only if something besides download_dinesafeto moved it
+            logger.error(f"{partial_path} is gone, keeping {latest_path}")
+            return latest_path
+        add_xml(download_directory, download_path)
+        logger.info(f"Downloaded to {download_path}")
+        state.update(path=download_path, sha256=content_hash.hexdigest())
+    write_download_state(download_directory, state)
+    return state["path"]
 
 
 def get_latest_dinesafeto_xml(download_directory="data/dinesafe") -> Optional[str]:
-    xml_paths = list(glob(os.path.join(download_directory, "*.xml")))
-    xml_paths.sort(reverse=True)
-    return xml_paths[0] if len(xml_paths) > 0 else None
+    return get_latest_xml(download_directory)
 
 
-def get_parsed_value(d, k):
+EPOCH_ORDINAL = EPOCH.toordinal()
+
+
+@lru_cache(maxsize=None)
+def get_epoch_day(ymd: str) -> int:
+    # fast path for YMD_FORMAT, which is what every date in the data looks like,
+    # and there are only a few thousand distinct dates to begin with
+    if len(ymd) == 10 and ymd[4] == "-" and ymd[7] == "-":
+        return (
+            date(int(ymd[:4]), int(ymd[5:7]), int(ymd[8:10])).toordinal()
+            - EPOCH_ORDINAL
+        )
+    return to_epoch_day(datetime.strptime(ymd, YMD_FORMAT))
+
+
+def get_float_value(d, k) -> Optional[float]:
     v = d[k]
-    if v is None:
-        return None
-    if "DATE" in k:
-        return datetime.strptime(v, YMD_FORMAT)
-    if "AMOUNT" in k or "LATITUDE" in k or "LONGITUDE" in k:
-        return float(v)
-    return v
+    return float(v) if v is not None else None
+
+
+def get_interned(v: Optional[str]) -> Optional[str]:
+    # for values repeated across many records, so that they share one string
+    return sys.intern(v) if v is not None else None
+
+
+def get_interned_value(d, k) -> Optional[str]:
+    return get_interned(d[k])
 
 
 def get_infraction(d: dict) -> Infraction:
     return Infraction(
-        severity=get_parsed_value(d, "SEVERITY"),
-        deficiency=get_parsed_value(d, "DEFICIENCY"),
-        action=get_parsed_value(d, "ACTION"),
-        court_outcome=get_parsed_value(d, "COURT_OUTCOME"),
-        amount_fined=get_parsed_value(d, "AMOUNT_FINED"),
+        severity=get_interned_value(d, "SEVERITY"),
+        deficiency=get_interned_value(d, "DEFICIENCY"),
+        action=get_interned_value(d, "ACTION"),
+        court_outcome=get_interned_value(d, "COURT_OUTCOME"),
+        amount_fined=get_float_value(d, "AMOUNT_FINED"),
     )
 
 
@@ -68,9 +244,9 @@ def get_inspection(d: dict) -> Inspection:
         infraction_l = infraction_d_or_l
 
     return Inspection(
-        status=get_parsed_value(d, "STATUS"),
-        date=get_parsed_value(d, "DATE"),
-        infractions=[get_infraction(d) for d in infraction_l],
+        status=get_interned_value(d, "STATUS"),
+        day=get_epoch_day(d["DATE"]),
+        infractions=tuple(get_infraction(d) for d in infraction_l),
     )
 
 
@@ -81,38 +257,175 @@ def get_establishment(d: dict) -> Establishment:
         inspection_l = [inspection_d_or_l]
     else:
         inspection_l = inspection_d_or_l
-
-    inspections = {}
-    for inspection_d in inspection_l:
-        inspection = get_inspection(inspection_d)
-        inspections[inspection.date] = inspections.get(inspection.date, []) + [
-            inspection
-        ]
+    # there's nothing to order an inspection by without a date
+    dated_inspection_l = [d_i for d_i in inspection_l if d_i["DATE"] is not None]
+    if len(dated_inspection_l) < len(inspection_l):
+        logger.warning(
+            f"Skipping {len(inspection_l) - len(dated_inspection_l)} inspections "
+            f"without a date for establishment {d['ID']}"
+        )
 
     return Establishment(
-        id=get_parsed_value(d, "ID"),
-        name=get_parsed_value(d, "NAME"),
-        type=get_parsed_value(d, "TYPE"),
-        address=get_parsed_value(d, "ADDRESS"),
-        latitude=float(get_parsed_value(d, "LATITUDE")),
-        longitude=float(get_parsed_value(d, "LONGITUDE")),
-        status=get_parsed_value(d, "STATUS"),
-        inspections=inspections,
+        id=d["ID"],
+        name=d["NAME"],
+        type=get_interned_value(d, "TYPE"),
+        address=d["ADDRESS"],
+        latitude=float(d["LATITUDE"]),
+        longitude=float(d["LONGITUDE"]),
+        status=get_interned_value(d, "STATUS"),
+        inspections=tuple(get_inspection(d) for d in dated_inspection_l),
     )
 
 
-def get_establishments_from_xml(path_to_xml: str) -> Dict[str, Establishment]:
-    establishment_l = []
-    with open(path_to_xml) as f:
-        establishment_l = xmltodict.parse(f.read())["DINESAFE_DATA"]["ESTABLISHMENT"]
-    establishments = {}
-    for d in establishment_l:
-        try:
-            establishment = get_establishment(d)
-        except Exception as e:
-            logger.error(f"Failed to parse establishment: {d}")
-            raise (e)
+def get_element_dict(element: "ElementTree.Element"):
+    # same shape as xmltodict: leaves become their stripped text (or None if empty),
+    # other elements become dicts with repeated children collected into lists
+    if len(element) == 0:
+        text = element.text.strip() if element.text is not None else None
+        return text if text else None
+    d = {}
+    for child in element:
+        v = get_element_dict(child)
+        if child.tag not in d:
+            d[child.tag] = v
+        elif isinstance(d[child.tag], list):
+            d[child.tag].append(v)
+        else:
+            d[child.tag] = [d[child.tag], v]
+    return d
+
+
+def get_establishment_from_element(element: "ElementTree.Element") -> Establishment:
+    d = get_element_dict(element)
+    try:
+        return get_establishment(d)
+    except Exception as e:
+        logger.error(f"Failed to parse establishment: {d}")
+        raise (e)
+
+
+def iter_establishments_from_xml(path_to_xml: str) -> Iterator[Establishment]:
+    # stream through the file one <ESTABLISHMENT> at a time instead of building the whole tree,
+    # parser only imported when there's no snapshot to load from
+    from xml.etree import ElementTree
+
+    context = ElementTree.iterparse(path_to_xml, events=("start", "end"))
+    _, root = next(context)
+    for event, element in context:
+        if event != "end" or element.tag != "ESTABLISHMENT":
+            continue
+        establishment = get_establishment_from_element(element)
+        # parsed elements are kept as children of root, drop them as we go
+        root.clear()
+        yield establishment
+
+
+ESTABLISHMENT_START_TAG = b"<ESTABLISHMENT>"
+ESTABLISHMENT_END_TAG = b"</ESTABLISHMENT>"
+# big enough that sending chunks to and results back from workers is a small overhead
+CHUNK_BYTES = 1 << 22
+# each worker holds a chunk and its parsed establishments on top of the server's own
+# memory, and past a few of them merging the results is the bottleneck anyway
+MAX_DEFAULT_PARSE_WORKERS = 4
+
+
+def get_default_parse_workers() -> int:
+    # cpus this process may run on, e.g. fewer in a container than cpu_count says
+    if hasattr(os, "sched_getaffinity"):
+        num_cpus = len(os.sched_getaffinity(0))
+    else:
+        num_cpus = os.cpu_count() or 1
+    return max(1, min(num_cpus, MAX_DEFAULT_PARSE_WORKERS))
+
 
+PARSE_WORKERS = int(
+    os.getenv("DINESAFE_PARSE_WORKERS", str(get_default_parse_workers()))
+)
+
+
+def iter_establishment_chunks(
+    path_to_xml: str, chunk_bytes: int = CHUNK_BYTES
+) -> Iterator[bytes]:
+    # raw bytes of consecutive <ESTABLISHMENT> elements, split between elements
+    # so that each chunk can be parsed on its own
+    with open(path_to_xml, "rb") as f:
+        buffer = b""
+        while True:
+            block = f.read(chunk_bytes)
+            buffer += block
+            end = buffer.rfind(ESTABLISHMENT_END_TAG)
+            if end >= 0:
+                end += len(ESTABLISHMENT_END_TAG)
+                # also skips the xml declaration and <DINESAFE_DATA> in the first chunk
+                yield buffer[buffer.find(ESTABLISHMENT_START_TAG) : end]
+                buffer = buffer[end:]
+            if len(block) == 0:
+                return
+
+
+def get_establishments_from_chunk(chunk: bytes) -> List[Establishment]:
+    # runs in a worker process, the data is utf-8 so there's no need for the declaration
+    from xml.etree import ElementTree
+
+    root = ElementTree.fromstring(b"<DINESAFE_DATA>" + chunk + b"</DINESAFE_DATA>")
+    return [get_establishment_from_element(element) for element in root]
+
+
+def get_interned_establishment(establishment: Establishment) -> Establishment:
+    # strings interned in worker processes are copies once they're sent back
+    # any of them can be None for blank elements
+    establishment.type = get_interned(establishment.type)
+    establishment.status = get_interned(establishment.status)
+    for inspection in establishment.inspections:
+        inspection.status = get_interned(inspection.status)
+        for infraction in inspection.infractions:
+            for k in ["severity", "deficiency", "action", "court_outcome"]:
+                setattr(infraction, k, get_interned(getattr(infraction, k)))
+    establishment.summary = get_inspection_summary(establishment.inspections)
+    return establishment
+
+
+def get_interned_establishments(
+    establishments: List[Establishment],
+) -> Iterator[Establishment]:
+    for establishment in establishments:
+        yield get_interned_establishment(establishment)
+
+
+def iter_establishments_from_xml_in_parallel(
+    path_to_xml: str, workers: int = PARSE_WORKERS, chunk_bytes: int = CHUNK_BYTES
+) -> Iterator[Establishment]:
+    # same as iter_establishments_from_xml, with chunks parsed in worker processes,
+    # which are spawned since forking the threaded streamlit server isn't safe
+    # only a few chunks in flight at a time, so that memory doesn't grow with the file
+    max_pending = 2 * workers
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        pending: Deque["Future[List[Establishment]]"] = deque()
+        for chunk in iter_establishment_chunks(path_to_xml, chunk_bytes=chunk_bytes):
+            pending.append(executor.submit(get_establishments_from_chunk, chunk))
+            if len(pending) >= max_pending:
+                yield from get_interned_establishments(pending.popleft().result())
+        while len(pending) > 0:
+            yield from get_interned_establishments(pending.popleft().result())
+
+
+@timed("data.parse_xml")
+def get_establishments_from_xml(
+    path_to_xml: str, workers: Optional[int] = None
+) -> Dict[str, Establishment]:
+    # parsed in parallel by default, unless there's only one chunk to begin with
+    workers = PARSE_WORKERS if workers is None else workers
+    if workers > 1 and os.path.getsize(path_to_xml) > CHUNK_BYTES:
+        establishments_iter = iter_establishments_from_xml_in_parallel(
+            path_to_xml, workers=workers, chunk_bytes=CHUNK_BYTES
+        )
+    else:
+        establishments_iter = iter_establishments_from_xml(path_to_xml)
+
+    establishments = {}
+    for establishment in establishments_iter:
         if establishment.id in establishments:
             raise KeyError(
                 f"Establishment {establishment.id} already in establishments: {establishments}"
@@ -0,0 +1,34 @@
+from dataclasses import dataclass, field
+from typing import List, Mapping
+
+from dinesafe.data.types import Establishment
+
+
+@dataclass
+class EstablishmentsDiff:
+    added: List[Establishment] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    # new versions of establishments whose details or inspections changed
+    changed: List[Establishment] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.added) + len(self.removed) + len(self.changed)
+
+    def __str__(self) -> str:
+        return (
+            f"{len(self.added)} added, {len(self.removed)} removed, "
+            f"{len(self.changed)} changed"
+        )
+
+
+def get_establishments_diff(
+    old: Mapping[str, Establishment], new: Mapping[str, Establishment]
+) -> EstablishmentsDiff:
+    diff = EstablishmentsDiff(removed=[k for k in old if k not in new])
+    for k, establishment in new.items():
+        if k not in old:
+            diff.added.append(establishment)
+        # anything at all, down to the details of each infraction
+        elif old[k] != establishment:
+            diff.changed.append(establishment)
+    return diff
@@ -0,0 +1,74 @@
+import hashlib
+import logging
+import os
+import pickle
+from typing import Dict, Optional
+
+from dinesafe.data.parsed import get_establishments_from_xml
+from dinesafe.data.types import Establishment
+
+logger = logging.getLogger(__name__)
+
+# bump this whenever the pickled types change shape
+SNAPSHOT_SCHEMA_VERSION = 3
+
+
+def get_file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def get_snapshot_path(path_to_xml: str) -> str:
+    # not *.xml so that it doesn't get picked up as a download
+    return f"{path_to_xml}.snapshot"
+
+
+def get_snapshot_header(path_to_xml: str) -> dict:
+    return {
+        "schema_version": SNAPSHOT_SCHEMA_VERSION,
+        "xml_hash": get_file_hash(path_to_xml),
+    }
+
+
+def load_snapshot(path_to_xml: str) -> Optional[Dict[str, Establishment]]:
+    snapshot_path = get_snapshot_path(path_to_xml)
+    if not os.path.isfile(snapshot_path):
+        return None
+    try:
+        with open(snapshot_path, "rb") as f:
+            # header is pickled separately so that stale snapshots are rejected cheaply
+            if pickle.load(f) != get_snapshot_header(path_to_xml):
+                logger.info(f"Ignoring stale snapshot: {snapshot_path}")
+                return None
+            return pickle.load(f)
+    except Exception as e:
+        logger.error(f"Failed to load snapshot {snapshot_path}: {e}")
+    return None
+
+
+def write_snapshot(path_to_xml: str, establishments: Dict[str, Establishment]) -> str:
+    snapshot_path = get_snapshot_path(path_to_xml)
+    tmp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(
+            get_snapshot_header(path_to_xml), f, protocol=pickle.HIGHEST_PROTOCOL
+        )
+        pickle.dump(establishments, f, protocol=pickle.HIGHEST_PROTOCOL)
+    # atomic so that concurrent readers never see a partially written snapshot
+    os.replace(tmp_path, snapshot_path)
+    return snapshot_path
+
+
+def load_establishments(path_to_xml: str) -> Dict[str, Establishment]:
+    establishments = load_snapshot(path_to_xml)
+    if establishments is None:
+        logger.info(f"No valid snapshot, parsing {path_to_xml}")
+        establishments = get_establishments_from_xml(path_to_xml)
+        try:
+            write_snapshot(path_to_xml, establishments)
+        except OSError as e:
+            logger.error(f"Failed to write snapshot for {path_to_xml}: {e}")
+    return establishments
@@ -1,10 +1,40 @@
 import logging
-from dataclasses import dataclass
-from datetime import datetime
-from typing import Dict, List, Optional
+from dataclasses import dataclass, field, fields
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+# dates are stored as days since EPOCH, which is a lot smaller than a datetime
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_epoch_day(dt: datetime) -> int:
+    return (dt - EPOCH).days
+
+
+def from_epoch_day(day: int) -> datetime:
+    return EPOCH + timedelta(days=day)
+
+
+def slotted(cls):
+    # same as dataclass(slots=True), which needs python 3.10
+    field_names = tuple(f.name for f in fields(cls))
+    cls_dict = {k: v for k, v in cls.__dict__.items() if k not in field_names}
+    cls_dict["__slots__"] = field_names
+    cls_dict.pop("__dict__", None)
+    cls_dict.pop("__weakref__", None)
+    slotted_cls = type(cls)(cls.__name__, cls.__bases__, cls_dict)
+
+    # pickled as constructor arguments, which is a lot faster than the default for slots
+    init_field_names = tuple(f.name for f in fields(cls) if f.init)
+
+    def __reduce__(self):
+        return slotted_cls, tuple(getattr(self, k) for k in init_field_names)
+
+    slotted_cls.__reduce__ = __reduce__
+    return slotted_cls
+
 
 INFRACTION_STR = """
 severity: {severity}
@@ -16,15 +46,24 @@ amount_fined: {amount_fined}
 """
 
 
+@slotted
 @dataclass
 class Infraction:
     severity: str
     deficiency: str
     action: str
-    conviction_date: Optional[datetime] = None
+    conviction_day: Optional[int] = None
     court_outcome: Optional[str] = None
     amount_fined: Optional[float] = None
 
+    @property
+    def conviction_date(self) -> Optional[datetime]:
+        return (
+            from_epoch_day(self.conviction_day)
+            if self.conviction_day is not None
+            else None
+        )
+
     def __str__(self) -> str:
         return INFRACTION_STR.format(
             severity=self.severity,
@@ -44,11 +83,16 @@ infractions:
 """
 
 
+@slotted
 @dataclass
 class Inspection:
     status: str
-    date: datetime
-    infractions: List[Infraction]
+    day: int
+    infractions: Tuple[Infraction, ...]
+
+    @property
+    def date(self) -> datetime:
+        return from_epoch_day(self.day)
 
     def __str__(self) -> str:
         return INSPECTION_STR.format(
@@ -59,10 +103,56 @@ class Inspection:
             ),
         )
 
+    @property
     def is_pass(self) -> bool:
-        return self.status.lower() == "pass"
+        # a blank status isn't a pass
+        return self.status is not None and self.status.lower() == "pass"
 
 
+@slotted
+@dataclass
+class InspectionSummary:
+    latest_inspection: Optional[Inspection]
+    latest_status: Optional[str]
+    num_passed: int
+    num_inspections: int
+    # is_pass of each inspection, most recent first
+    pass_sequence: Tuple[bool, ...]
+
+    @property
+    def latest_passed(self) -> Optional[bool]:
+        return (
+            self.latest_inspection.is_pass
+            if self.latest_inspection is not None
+            else None
+        )
+
+    @property
+    def pass_proportion(self) -> Optional[float]:
+        return (
+            self.num_passed / self.num_inspections if self.num_inspections > 0 else None
+        )
+
+
+def get_inspection_summary(
+    inspections_latest_first: Tuple[Inspection, ...]
+) -> InspectionSummary:
+    pass_sequence = tuple(inspection.is_pass for inspection in inspections_latest_first)
+    latest_inspection = (
+        inspections_latest_first[0] if len(inspections_latest_first) > 0 else None
+    )
+    return InspectionSummary(
+        latest_inspection=latest_inspection,
+        latest_status=latest_inspection.status
+        if latest_inspection is not None
+        else None,
+        num_passed=sum(pass_sequence),
+        num_inspections=len(pass_sequence),
+        pass_sequence=pass_sequence,
+    )
+
+
+@slotted
 @dataclass
 class Establishment:
     id: str
@@ -72,26 +162,41 @@ class Establishment:
     latitude: float
     longitude: float
     status: str
-    inspections: Dict[datetime, List[Inspection]]
+    # sorted most recent first on init, same dates keep their order,
+    # also takes the Dict[datetime, List[Inspection]] that this used to be
+    inspections: Tuple[Inspection, ...]
+    # computed once from inspections, which aren't expected to change afterwards
+    summary: InspectionSummary = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        inspections = self.inspections
+        if isinstance(inspections, dict):
+            inspections = [i for l in inspections.values() for i in l]
+        self.inspections = tuple(sorted(inspections, key=lambda x: x.day, reverse=True))
+        self.summary = get_inspection_summary(self.inspections)
 
     @property
     def external_id(self) -> str:
         return f"DinesafeTO_{self.id}"
 
+    @property
+    def inspections_latest_first(self) -> Tuple[Inspection, ...]:
+        return self.inspections
+
+    @property
+    def inspections_by_date(self) -> Dict[datetime, List[Inspection]]:
+        # what inspections used to be, built on every access
+        d: Dict[datetime, List[Inspection]] = {}
+        for inspection in self.inspections:
+            d.setdefault(inspection.date, []).append(inspection)
+        return d
+
     @property
     def latest_inspection_date(self) -> Optional[datetime]:
-        return max(self.inspections.keys())
+        latest_inspection = self.summary.latest_inspection
+        return latest_inspection.date if latest_inspection is not None else None
 
     @property
-    def inspections_latest_first(self) -> List[Inspection]:
-        inspections = []
-        for v in self.inspections.values():
-            inspections += v
-        inspections.sort(key=lambda x: x.date, reverse=True)
-        return inspections
-
-    def passed_most_recent_inspection(self) -> bool:
-        return (
-            len(self.inspections_latest_first) > 0
-            and self.inspections_latest_first[0].is_pass
-        )
+    def passed_most_recent_inspection(self) -> Optional[bool]:
+        # None if there are no inspections
+        return self.summary.latest_passed
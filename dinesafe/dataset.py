@@ -0,0 +1,93 @@
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from typing import Mapping, Optional, Tuple
+
+from dinesafe.data.columnar import (
+    ColumnarEstablishments,
+    get_columnar_establishments_diff,
+    load_columnar_establishments,
+)
+from dinesafe.data.refresh import EstablishmentsDiff, get_establishments_diff
+from dinesafe.data.snapshot import load_establishments
+from dinesafe.data.types import Establishment
+from dinesafe.index import (
+    EstablishmentIndex,
+    build_establishment_index,
+    build_establishment_index_from_columnar,
+)
+from dinesafe.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Dataset:
+    path_to_xml: str
+    establishments: Mapping[str, Establishment]
+    index: EstablishmentIndex
+
+    @property
+    def shared(self) -> bool:
+        # memory mapped, so shared by every process that loaded it
+        return isinstance(self.establishments, ColumnarEstablishments)
+
+    @property
+    def version(self) -> str:
+        # downloads are named by timestamp, which makes for a readable version
+        return os.path.basename(self.path_to_xml)
+
+
+@timed("dataset.load")
+def load_dataset(path_to_xml: str, shared: bool = False) -> Dataset:
+    if shared:
+        establishments = load_columnar_establishments(path_to_xml)
+        return Dataset(
+            path_to_xml=path_to_xml,
+            establishments=establishments,
+            index=build_establishment_index_from_columnar(establishments),
+        )
+    establishments = load_establishments(path_to_xml)
+    return Dataset(
+        path_to_xml=path_to_xml,
+        establishments=establishments,
+        index=build_establishment_index(establishments.values()),
+    )
+
+
+@timed("dataset.refresh")
+def refresh_dataset(
+    dataset: Dataset, path_to_xml: str
+) -> Tuple[Dataset, EstablishmentsDiff]:
+    # rebuilt from scratch, patching the indexes in place wasn't any faster since row
+    # numbers shift with every added or removed establishment, the diff is only reported
+    new_dataset = load_dataset(path_to_xml, shared=dataset.shared)
+    if dataset.shared:
+        # found from the columns rather than by building every establishment
+        diff = get_columnar_establishments_diff(
+            old=dataset.establishments, new=new_dataset.establishments
+        )
+    else:
+        diff = get_establishments_diff(
+            old=dataset.establishments, new=new_dataset.establishments
+        )
+    return new_dataset, diff
+
+
+class DatasetStore:
+    # holds the loaded dataset, which gets swapped in whole so readers never see a partial refresh
+    def __init__(self, dataset: Dataset):
+        self.dataset = dataset
+        self._lock = threading.Lock()
+
+    def refresh(self, path_to_xml: Optional[str]) -> Optional[EstablishmentsDiff]:
+        with self._lock:
+            if path_to_xml is None or path_to_xml == self.dataset.path_to_xml:
+                return None
+            dataset, diff = refresh_dataset(self.dataset, path_to_xml)
+            logger.info(
+                f"Refreshed {self.dataset.version} to {dataset.version}: {diff}"
+            )
+            self.dataset = dataset
+        return diff
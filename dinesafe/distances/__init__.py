@@ -7,7 +7,7 @@ def normalize(
     if lowest_val >= hightest_val:
         raise ValueError("lowest val must be strictly smaller than highest val")
     # normalize to 0, 1
-    arr_min, arr_max = min(arr), max(arr)
+    arr_min, arr_max = arr.min(), arr.max()
     arr_range = arr_max - arr_min
     if arr_range > 0.0:
         arr = (arr - arr_min) / arr_range
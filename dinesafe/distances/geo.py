@@ -1,8 +1,12 @@
 from dataclasses import dataclass
-from math import radians
-from typing import List, Optional, Tuple
+from math import asin, cos, pi, radians, sin
+from typing import Optional, Sequence, Tuple, Union
 
-from sklearn.metrics.pairwise import haversine_distances
+import numpy as np
+
+from dinesafe.metrics import timed
+
+EARTH_RADIUS_KM = 6371.0
 
 
 @dataclass
@@ -29,9 +33,137 @@ def parse_geolocation(d: dict) -> GeoLocation:
     )
 
 
+@timed("search.geo_distances")
+def get_haversine_distances_from_radians(
+    center_loc: Union[Tuple[float, float], np.ndarray],
+    latitudes: np.ndarray,
+    longitudes: np.ndarray,
+) -> np.ndarray:
+    # great circle distances on the unit sphere, shaped (len(latitudes),) for one center
+    # or (len(center_loc), len(latitudes)) for an array of centers
+    centers = np.asarray(center_loc, dtype=np.float64)
+    center_lats = centers[..., 0, np.newaxis]
+    center_lons = centers[..., 1, np.newaxis]
+    a = (
+        np.sin((latitudes - center_lats) / 2) ** 2
+        + np.cos(latitudes)
+        * np.cos(center_lats)
+        * np.sin((longitudes - center_lons) / 2) ** 2
+    )
+    return 2 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
 def get_haversine_distances(
-    center_loc: Tuple[float, float], locs: List[Tuple[float, float]]
-) -> List[float]:
-    center_loc = [[radians(v) for v in center_loc]]
-    locs = [[radians(v) for v in loc] for loc in locs]
-    return list(haversine_distances(X=locs, Y=center_loc)[:, 0])
+    center_loc: Union[Tuple[float, float], np.ndarray],
+    locs: Union[Sequence[Tuple[float, float]], np.ndarray],
+) -> np.ndarray:
+    # same as get_haversine_distances_from_radians, but with center_loc and locs in degrees
+    locs = np.radians(np.asarray(locs, dtype=np.float64).reshape(-1, 2))
+    return get_haversine_distances_from_radians(
+        center_loc=np.radians(center_loc),
+        latitudes=locs[:, 0],
+        longitudes=locs[:, 1],
+    )
+
+
+# grid cell keys are (lat cell + offset) * width + (lon cell + offset)
+GRID_KEY_OFFSET = 1 << 20
+GRID_KEY_WIDTH = 1 << 21
+
+
+@dataclass
+class GeoIndex:
+    # in radians, aligned by row
+    latitudes: np.ndarray
+    longitudes: np.ndarray
+    # in radians
+    cell_size: float
+    # rows sorted by grid cell key, so that each row of cells is a contiguous slice
+    sorted_keys: np.ndarray
+    sorted_rows: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.latitudes)
+
+    def get_candidate_rows(
+        self, center_loc: Tuple[float, float], r: float
+    ) -> np.ndarray:
+        # rows in cells overlapping the bounding box of the circle with radius r around center_loc
+        lat, lon = center_loc
+        lat_lo = int(np.floor((lat - r) / self.cell_size))
+        lat_hi = int(np.floor((lat + r) / self.cell_size))
+        if lat_hi - lat_lo + 1 > len(self):
+            # more rows of cells than establishments, cheaper to check everything
+            return self.sorted_rows
+        if abs(lat) + r < pi / 2:
+            dlon = asin(min(1.0, sin(r) / cos(lat)))
+        else:
+            dlon = pi
+        if lon - dlon < -pi or lon + dlon > pi:
+            # around the poles or across the antimeridian, take whole rows of cells
+            lon_lo, lon_hi = -GRID_KEY_OFFSET, GRID_KEY_OFFSET - 1
+        else:
+            lon_lo = int(np.floor((lon - dlon) / self.cell_size))
+            lon_hi = int(np.floor((lon + dlon) / self.cell_size))
+
+        slices = []
+        for lat_cell in range(lat_lo, lat_hi + 1):
+            key_base = (lat_cell + GRID_KEY_OFFSET) * GRID_KEY_WIDTH + GRID_KEY_OFFSET
+            start = np.searchsorted(self.sorted_keys, key_base + lon_lo, side="left")
+            stop = np.searchsorted(self.sorted_keys, key_base + lon_hi, side="right")
+            slices.append(self.sorted_rows[start:stop])
+        return np.concatenate(slices) if len(slices) > 0 else self.sorted_rows[:0]
+
+    def query_radius(
+        self, center_loc: Tuple[float, float], r: float
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        rows = self.get_candidate_rows(center_loc=center_loc, r=r)
+        if len(rows) == 0:
+            return rows, np.zeros(0)
+        distances = get_haversine_distances_from_radians(
+            center_loc=center_loc,
+            latitudes=self.latitudes[rows],
+            longitudes=self.longitudes[rows],
+        )
+        mask = distances <= r
+        return rows[mask], distances[mask]
+
+    def within_radius(self, coords: Coords, km: float) -> np.ndarray:
+        # rows within km of coords, in row order
+        rows, _ = self.query_radius(
+            center_loc=(radians(coords.latitude), radians(coords.longitude)),
+            r=km / EARTH_RADIUS_KM,
+        )
+        return np.sort(rows)
+
+    def nearest(self, coords: Coords, k: int) -> np.ndarray:
+        # k closest rows, closest first
+        center_loc = (radians(coords.latitude), radians(coords.longitude))
+        k = min(k, len(self))
+        r = self.cell_size
+        rows, distances = self.query_radius(center_loc=center_loc, r=r)
+        # grow the radius until it holds at least k rows, which then include the k closest
+        while len(rows) < k and r < pi:
+            r *= 2
+            rows, distances = self.query_radius(center_loc=center_loc, r=r)
+        order = np.lexsort((rows, distances))[:k]
+        return rows[order]
+
+
+def build_geo_index(
+    latitudes: np.ndarray, longitudes: np.ndarray, cell_km: float = 0.5
+) -> GeoIndex:
+    cell_size = cell_km / EARTH_RADIUS_KM
+    lat_cells = np.floor(latitudes / cell_size).astype(np.int64)
+    lon_cells = np.floor(longitudes / cell_size).astype(np.int64)
+    keys = (lat_cells + GRID_KEY_OFFSET) * GRID_KEY_WIDTH + (
+        lon_cells + GRID_KEY_OFFSET
+    )
+    sorted_rows = np.argsort(keys, kind="stable")
+    return GeoIndex(
+        latitudes=latitudes,
+        longitudes=longitudes,
+        cell_size=cell_size,
+        sorted_keys=keys[sorted_rows],
+        sorted_rows=sorted_rows,
+    )
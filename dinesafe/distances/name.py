@@ -1,11 +1,117 @@
-from typing import List
+from bisect import bisect_left
+from dataclasses import dataclass
+from math import ceil
+from typing import Dict, Iterable, List, Optional, Set
 
-from rapidfuzz import fuzz, utils
+import numpy as np
+from rapidfuzz import fuzz, process, utils
 
+from dinesafe.metrics import timed
 
-def get_name_distances(search_term: str, doc_strs: List[str]) -> List[float]:
-    return [
-        # fuzz.WRatio returns similarity between 0 and 100
-        1.0 - fuzz.WRatio(search_term, s, processor=utils.default_process) / 100.0
-        for s in doc_strs
-    ]
+
+def get_processed_names(names: List[str]) -> List[str]:
+    return [utils.default_process(s) for s in names]
+
+
+@timed("search.name_distances")
+def get_name_distances(
+    search_term: str,
+    doc_strs: List[str],
+    processed: bool = False,
+    score_cutoff: Optional[float] = None,
+) -> np.ndarray:
+    # doc_strs can be processed ahead of time with get_processed_names
+    if not processed:
+        doc_strs = get_processed_names(doc_strs)
+    # fuzz.WRatio returns similarity between 0 and 100, anything below score_cutoff is 0
+    scores = process.cdist(
+        [utils.default_process(search_term)],
+        doc_strs,
+        scorer=fuzz.WRatio,
+        processor=None,
+        score_cutoff=score_cutoff,
+        dtype=np.float64,
+        workers=-1,
+    )[0]
+    return 1.0 - scores / 100.0
+
+
+def get_tokens(processed_name: str) -> Set[str]:
+    return set(processed_name.split())
+
+
+def get_trigrams(processed_name: str) -> Set[str]:
+    # padded per token so that short tokens and word boundaries still count
+    trigrams = set()
+    for token in get_tokens(processed_name):
+        padded = f" {token} "
+        trigrams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return trigrams
+
+
+@dataclass
+class NameIndex:
+    # sorted, so that tokens sharing a prefix are contiguous
+    tokens: List[str]
+    # rows with each token, aligned with tokens
+    token_rows: List[np.ndarray]
+    trigram_rows: Dict[str, np.ndarray]
+
+    def get_prefix_rows(self, prefix: str) -> List[np.ndarray]:
+        rows = []
+        i = bisect_left(self.tokens, prefix)
+        while i < len(self.tokens) and self.tokens[i].startswith(prefix):
+            rows.append(self.token_rows[i])
+            i += 1
+        return rows
+
+    def get_candidate_rows(
+        self,
+        search_term: str,
+        min_query_length: int = 3,
+        min_trigram_fraction: float = 0.3,
+    ) -> Optional[np.ndarray]:
+        # None means there's too little to go on, so everything should be scored
+        processed = utils.default_process(search_term)
+        if len(processed.replace(" ", "")) < min_query_length:
+            return None
+
+        # rows with any token starting with a (long enough) query token
+        rows = []
+        for token in get_tokens(processed):
+            if len(token) >= min_query_length:
+                rows += self.get_prefix_rows(token)
+
+        # rows sharing enough trigrams with the query, e.g. for typos
+        trigrams = get_trigrams(processed)
+        trigram_rows = [
+            self.trigram_rows[t] for t in trigrams if t in self.trigram_rows
+        ]
+        if len(trigram_rows) > 0:
+            hit_rows, hit_counts = np.unique(
+                np.concatenate(trigram_rows), return_counts=True
+            )
+            min_hits = max(1, ceil(min_trigram_fraction * len(trigrams)))
+            rows.append(hit_rows[hit_counts >= min_hits])
+
+        if len(rows) == 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate(rows))
+
+
+def build_name_index(processed_names: Iterable[str]) -> NameIndex:
+    token_rows: Dict[str, List[int]] = {}
+    trigram_rows: Dict[str, List[int]] = {}
+    for i, processed_name in enumerate(processed_names):
+        for token in get_tokens(processed_name):
+            token_rows.setdefault(token, []).append(i)
+        for trigram in get_trigrams(processed_name):
+            trigram_rows.setdefault(trigram, []).append(i)
+    tokens = sorted(token_rows)
+    return NameIndex(
+        tokens=tokens,
+        token_rows=[np.array(token_rows[t], dtype=np.int64) for t in tokens],
+        trigram_rows={
+            t: np.array(rows, dtype=np.int64) for t, rows in trigram_rows.items()
+        },
+    )
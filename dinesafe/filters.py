@@ -0,0 +1,168 @@
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from dinesafe.data.columnar import MISSING_DAY
+from dinesafe.data.types import Establishment
+
+
+@dataclass(frozen=True)
+class EstablishmentFilter:
+    # None for any, otherwise one of
+    latest_statuses: Optional[Tuple[str, ...]] = None
+    types: Optional[Tuple[str, ...]] = None
+    # any infraction in the latest inspection with one of these severities
+    severities: Optional[Tuple[str, ...]] = None
+    # latest inspection wasn't a pass
+    failed_only: bool = False
+    # days since EPOCH of the latest inspection, both inclusive
+    min_latest_day: Optional[int] = None
+    max_latest_day: Optional[int] = None
+
+
+def intersect_sorted(rows: np.ndarray, other_rows: np.ndarray) -> np.ndarray:
+    # rows also in other_rows, both sorted and unique, in time proportional to len(rows)
+    if len(rows) == 0 or len(other_rows) == 0:
+        return rows[:0]
+    i = np.minimum(np.searchsorted(other_rows, rows), len(other_rows) - 1)
+    return rows[other_rows[i] == rows]
+
+
+@dataclass
+class CategoryIndex:
+    # sorted rows for each value
+    rows_by_value: Dict[str, np.ndarray]
+
+    def get_rows(self, values: Iterable[str]) -> np.ndarray:
+        rows = [self.rows_by_value[v] for v in values if v in self.rows_by_value]
+        if len(rows) == 0:
+            return np.array([], dtype=np.intp)
+        if len(rows) == 1:
+            return rows[0]
+        return np.unique(np.concatenate(rows))
+
+    def get_counts(self) -> Dict[str, int]:
+        return {v: len(rows) for v, rows in self.rows_by_value.items()}
+
+
+def build_category_index(values: Iterable[Iterable[Optional[str]]]) -> CategoryIndex:
+    # values are the ones for each row, which can have any number of them
+    rows_by_value: Dict[str, List[int]] = {}
+    for i, row_values in enumerate(values):
+        for v in row_values:
+            if v is not None:
+                rows_by_value.setdefault(v, []).append(i)
+    return CategoryIndex(
+        rows_by_value={
+            v: np.array(rows, dtype=np.intp) for v, rows in rows_by_value.items()
+        }
+    )
+
+
+@dataclass
+class DayIndex:
+    # rows with a day, sorted by day
+    sorted_days: np.ndarray
+    sorted_rows: np.ndarray
+
+    def get_rows(
+        self, min_day: Optional[int] = None, max_day: Optional[int] = None
+    ) -> np.ndarray:
+        start = 0
+        if min_day is not None:
+            start = np.searchsorted(self.sorted_days, min_day, side="left")
+        stop = len(self.sorted_days)
+        if max_day is not None:
+            stop = np.searchsorted(self.sorted_days, max_day, side="right")
+        return np.sort(self.sorted_rows[start:stop])
+
+
+def build_day_index(days: np.ndarray) -> DayIndex:
+    rows = np.flatnonzero(days != MISSING_DAY)
+    order = np.argsort(days[rows], kind="stable")
+    return DayIndex(sorted_days=days[rows][order], sorted_rows=rows[order])
+
+
+@dataclass
+class FilterIndex:
+    status_index: CategoryIndex
+    type_index: CategoryIndex
+    severity_index: CategoryIndex
+    latest_day_index: DayIndex
+    # latest inspection wasn't a pass, same as Inspection.is_pass
+    failed_rows: np.ndarray
+
+    def get_rows(
+        self, establishment_filter: EstablishmentFilter
+    ) -> Optional[np.ndarray]:
+        # sorted rows matching every part of the filter, None if it doesn't filter anything
+        f = establishment_filter
+        candidates = []
+        if f.latest_statuses is not None:
+            candidates.append(self.status_index.get_rows(f.latest_statuses))
+        if f.types is not None:
+            candidates.append(self.type_index.get_rows(f.types))
+        if f.severities is not None:
+            candidates.append(self.severity_index.get_rows(f.severities))
+        if f.failed_only:
+            candidates.append(self.failed_rows)
+        if f.min_latest_day is not None or f.max_latest_day is not None:
+            candidates.append(
+                self.latest_day_index.get_rows(
+                    min_day=f.min_latest_day, max_day=f.max_latest_day
+                )
+            )
+        if len(candidates) == 0:
+            return None
+        # start from the smallest so that the rest only costs as much as it
+        candidates.sort(key=len)
+        rows = candidates[0]
+        for other_rows in candidates[1:]:
+            rows = intersect_sorted(rows, other_rows)
+        return rows
+
+
+def get_latest_severities(establishment: Establishment) -> Tuple[str, ...]:
+    latest_inspection = establishment.summary.latest_inspection
+    if latest_inspection is None:
+        return ()
+    return tuple(
+        sorted(
+            {
+                i.severity
+                for i in latest_inspection.infractions
+                if i.severity is not None
+            }
+        )
+    )
+
+
+def get_latest_day(establishment: Establishment) -> int:
+    latest_inspection = establishment.summary.latest_inspection
+    return latest_inspection.day if latest_inspection is not None else MISSING_DAY
+
+
+def build_filter_index(
+    latest_statuses: np.ndarray,
+    types: np.ndarray,
+    latest_severities: Sequence[Tuple[str, ...]],
+    latest_days: np.ndarray,
+) -> FilterIndex:
+    status_index = build_category_index((s,) for s in latest_statuses)
+    # a blank latest status isn't a pass either, unlike having no inspections at all
+    blank_rows = np.flatnonzero(
+        np.equal(latest_statuses, None) & (latest_days != MISSING_DAY)
+    )
+    return FilterIndex(
+        status_index=status_index,
+        type_index=build_category_index((t,) for t in types),
+        severity_index=build_category_index(latest_severities),
+        latest_day_index=build_day_index(latest_days),
+        failed_rows=np.union1d(
+            status_index.get_rows(
+                [s for s in status_index.rows_by_value if s.lower() != "pass"]
+            ),
+            blank_rows,
+        ).astype(np.intp),
+    )
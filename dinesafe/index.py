@@ -0,0 +1,129 @@
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from dinesafe.data.columnar import ColumnarEstablishments, ColumnarRows
+from dinesafe.data.types import Establishment
+from dinesafe.distances.geo import GeoIndex, build_geo_index
+from dinesafe.distances.name import NameIndex, build_name_index, get_processed_names
+from dinesafe.filters import (
+    FilterIndex,
+    build_filter_index,
+    get_latest_day,
+    get_latest_severities,
+)
+
+
+@dataclass
+class EstablishmentIndex:
+    # all columns are aligned by row with establishments
+    establishments: Sequence[Establishment]
+    ids: np.ndarray
+    rows_by_id: Dict[str, int]
+    names: List[str]
+    # names processed for fuzzy matching
+    processed_names: List[str]
+    # in radians
+    latitudes: np.ndarray
+    longitudes: np.ndarray
+    # None if there are no inspections, or the latest one has a blank status
+    latest_statuses: np.ndarray
+    types: np.ndarray
+    # MISSING_DAY if there are no inspections
+    latest_days: np.ndarray
+    latest_severities: List[Tuple[str, ...]]
+    filter_index: FilterIndex
+    geo_index: GeoIndex
+    # None to always score every name
+    name_index: Optional[NameIndex]
+
+    def __len__(self) -> int:
+        return len(self.establishments)
+
+    def get_establishments(self, rows: Iterable[int]) -> List[Establishment]:
+        return [self.establishments[i] for i in rows]
+
+    def get_failed_rows(self) -> np.ndarray:
+        # rows whose latest inspection wasn't a pass, same as Inspection.is_pass
+        return self.filter_index.failed_rows
+
+
+def get_establishment_index(
+    establishments: Sequence[Establishment],
+    ids: np.ndarray,
+    names: List[str],
+    latitudes: np.ndarray,
+    longitudes: np.ndarray,
+    latest_statuses: np.ndarray,
+    types: np.ndarray,
+    latest_days: np.ndarray,
+    latest_severities: List[Tuple[str, ...]],
+    with_name_index: bool = True,
+) -> EstablishmentIndex:
+    processed_names = get_processed_names(names)
+    return EstablishmentIndex(
+        establishments=establishments,
+        ids=ids,
+        rows_by_id={k: i for i, k in enumerate(ids)},
+        names=names,
+        processed_names=processed_names,
+        latitudes=latitudes,
+        longitudes=longitudes,
+        geo_index=build_geo_index(latitudes=latitudes, longitudes=longitudes),
+        name_index=build_name_index(processed_names) if with_name_index else None,
+        latest_statuses=latest_statuses,
+        types=types,
+        latest_days=latest_days,
+        latest_severities=latest_severities,
+        filter_index=build_filter_index(
+            latest_statuses=latest_statuses,
+            types=types,
+            latest_severities=latest_severities,
+            latest_days=latest_days,
+        ),
+    )
+
+
+def build_establishment_index(
+    establishments: Iterable[Establishment], with_name_index: bool = True
+) -> EstablishmentIndex:
+    establishments = list(establishments)
+    return get_establishment_index(
+        establishments=establishments,
+        ids=np.array([e.id for e in establishments], dtype=object),
+        names=[e.name for e in establishments],
+        latitudes=np.radians(
+            np.array([e.latitude for e in establishments], dtype=np.float64)
+        ),
+        longitudes=np.radians(
+            np.array([e.longitude for e in establishments], dtype=np.float64)
+        ),
+        latest_statuses=np.array(
+            [e.summary.latest_status for e in establishments], dtype=object
+        ),
+        types=np.array([e.type for e in establishments], dtype=object),
+        latest_days=np.array(
+            [get_latest_day(e) for e in establishments], dtype=np.int32
+        ),
+        latest_severities=[get_latest_severities(e) for e in establishments],
+        with_name_index=with_name_index,
+    )
+
+
+def build_establishment_index_from_columnar(
+    establishments: ColumnarEstablishments, with_name_index: bool = True
+) -> EstablishmentIndex:
+    # straight from the columns, establishments are only built for rows that get returned
+    return get_establishment_index(
+        establishments=ColumnarRows(establishments),
+        ids=np.array(establishments.ids, dtype=object),
+        names=establishments.strings["name"].to_list(),
+        latitudes=np.radians(establishments.columns["latitude"]),
+        longitudes=np.radians(establishments.columns["longitude"]),
+        latest_statuses=establishments.get_latest_statuses(),
+        types=establishments.get_types(),
+        latest_days=establishments.get_latest_days(),
+        latest_severities=establishments.get_latest_severities(),
+        with_name_index=with_name_index,
+    )
@@ -0,0 +1,197 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import wraps
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# off by default, in which case timers and counters cost a couple of checks
+METRICS_ENABLED = os.getenv("DINESAFE_METRICS", "false").lower() == "true"
+METRICS_PREFIX = "dinesafe"
+
+_enabled = METRICS_ENABLED
+
+
+def set_enabled(enabled: bool):
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+@dataclass
+class StageStats:
+    count: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+
+class Metrics:
+    # process wide totals, exported in the prometheus text format
+    def __init__(self):
+        self.stages: Dict[str, StageStats] = {}
+        self.counters: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            stats = self.stages.setdefault(stage, StageStats())
+            stats.count += 1
+            stats.total_seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+
+    def increment(self, counter: str, value: float = 1.0):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0.0) + value
+
+    def reset(self):
+        with self._lock:
+            self.stages.clear()
+            self.counters.clear()
+
+    def to_prometheus(self) -> str:
+        with self._lock:
+            stages = sorted(self.stages.items())
+            counters = sorted(self.counters.items())
+        lines = [
+            f"# HELP {METRICS_PREFIX}_stage_seconds Time spent in each stage.",
+            f"# TYPE {METRICS_PREFIX}_stage_seconds summary",
+        ]
+        for stage, stats in stages:
+            labels = f'{{stage="{stage}"}}'
+            lines.append(f"{METRICS_PREFIX}_stage_seconds_count{labels} {stats.count}")
+            lines.append(
+                f"{METRICS_PREFIX}_stage_seconds_sum{labels} {stats.total_seconds:.6f}"
+            )
+        lines += [
+            f"# HELP {METRICS_PREFIX}_stage_max_seconds Slowest run of each stage.",
+            f"# TYPE {METRICS_PREFIX}_stage_max_seconds gauge",
+        ]
+        for stage, stats in stages:
+            lines.append(
+                f'{METRICS_PREFIX}_stage_max_seconds{{stage="{stage}"}} '
+                f"{stats.max_seconds:.6f}"
+            )
+        lines += [
+            f"# HELP {METRICS_PREFIX}_events_total Number of times each event happened.",
+            f"# TYPE {METRICS_PREFIX}_events_total counter",
+        ]
+        for counter, value in counters:
+            lines.append(
+                f'{METRICS_PREFIX}_events_total{{event="{counter}"}} {value:g}'
+            )
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+def write_prometheus(path: str, metrics: Metrics = METRICS):
+    # e.g. for node_exporter's textfile collector, which shouldn't see partial files
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(metrics.to_prometheus())
+    os.replace(tmp_path, path)
+
+
+class Breakdown:
+    # stages timed within a single request, recorded even if metrics are disabled,
+    # but only if the breakdown itself is enabled
+    def __init__(self, name: str, enabled: bool = True):
+        self.name = name
+        self.enabled = enabled
+        self.stages: List[Tuple[str, float]] = []
+        self.total_seconds = 0.0
+        self._start = 0.0
+        self._token = None
+
+    def __enter__(self) -> "Breakdown":
+        if self.enabled:
+            self._token = _breakdown.set(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.total_seconds = time.perf_counter() - self._start
+        if self.enabled:
+            _breakdown.reset(self._token)
+            logger.info(json.dumps(self.to_dict()))
+
+    def get_totals(self) -> Dict[str, StageStats]:
+        totals: Dict[str, StageStats] = {}
+        for stage, seconds in self.stages:
+            stats = totals.setdefault(stage, StageStats())
+            stats.count += 1
+            stats.total_seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+        return totals
+
+    def to_dict(self) -> dict:
+        # one structured log line per request
+        return {
+            "event": "breakdown",
+            "name": self.name,
+            "total_ms": round(1000 * self.total_seconds, 3),
+            "stages": {
+                stage: {"count": s.count, "total_ms": round(1000 * s.total_seconds, 3)}
+                for stage, s in self.get_totals().items()
+            },
+        }
+
+
+_breakdown: ContextVar[Optional[Breakdown]] = ContextVar("breakdown", default=None)
+
+
+def record(stage: str, seconds: float):
+    if _enabled:
+        METRICS.observe(stage, seconds)
+    breakdown = _breakdown.get()
+    if breakdown is not None:
+        breakdown.stages.append((stage, seconds))
+
+
+def increment(counter: str, value: float = 1.0):
+    if _enabled:
+        METRICS.increment(counter, value)
+
+
+class Stage:
+    # times a block, e.g. with Stage("views.map_geojson"): ...
+    __slots__ = ["name", "start"]
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        if _enabled or _breakdown.get() is not None:
+            self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        if self.start is not None:
+            record(self.name, time.perf_counter() - self.start)
+
+
+def timed(name: str) -> Callable:
+    # times every call of the decorated function
+    def decorator(f: Callable) -> Callable:
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if not _enabled and _breakdown.get() is None:
+                return f(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
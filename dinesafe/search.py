@@ -1,38 +1,186 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 from typing import List, Optional
 
 import numpy as np
+from rapidfuzz import utils
 
 from dinesafe.data.types import Establishment
+from dinesafe.dataset import Dataset
 from dinesafe.distances import normalize
-from dinesafe.distances.geo import Coords, get_haversine_distances
+from dinesafe.distances.geo import Coords, get_haversine_distances_from_radians
 from dinesafe.distances.name import get_name_distances
+from dinesafe.filters import EstablishmentFilter, intersect_sorted
+from dinesafe.index import EstablishmentIndex
+from dinesafe.metrics import increment, timed
 
+# about 100m of latitude, so searches from nearly the same spot share results
+GRID_DEGREES = 0.001
+MAX_ENTRIES = 1024
+TTL_SECONDS = 60 * 60
 
+
+@timed("search.top_k")
+def get_top_k_rows(scores: np.ndarray, k: Optional[int] = None) -> np.ndarray:
+    # same rows as a stable argsort truncated to k, but only the best k get sorted
+    if k is None or k >= len(scores):
+        return np.argsort(scores, kind="stable")
+    if k <= 0:
+        return np.array([], dtype=np.intp)
+    kth_score = np.partition(scores, k - 1)[k - 1]
+    # keep every row tied with the kth score so that ties resolve by row order
+    candidates = np.flatnonzero(scores <= kth_score)
+    return candidates[np.argsort(scores[candidates], kind="stable")][:k]
+
+
+@timed("search.total")
 def get_relevant_establishments(
-    establishments_list: List[Establishment],
+    index: EstablishmentIndex,
     coords: Optional[Coords] = None,
     search_term: Optional[str] = None,
+    limit: Optional[int] = None,
+    radius_km: Optional[float] = None,
+    establishment_filter: Optional[EstablishmentFilter] = None,
 ) -> List[Establishment]:
-    name_ds = [1.0 for _ in establishments_list]
+    # candidate rows, all of them unless filtered or restricted to a radius around coords
+    rows = None
+    if establishment_filter is not None:
+        rows = index.filter_index.get_rows(establishment_filter)
+    if coords is not None and radius_km is not None:
+        radius_rows = index.geo_index.within_radius(coords=coords, km=radius_km)
+        if rows is None:
+            rows = radius_rows
+        else:
+            rows = intersect_sorted(*sorted([rows, radius_rows], key=len))
+    if rows is None:
+        rows = np.arange(len(index))
+    if len(rows) == 0:
+        return []
+
+    name_ds = np.ones(len(rows))
     if search_term is not None and len(search_term) > 0:
-        name_ds = get_name_distances(
-            search_term=search_term, doc_strs=[e.name for e in establishments_list]
-        )
-        name_ds = list(normalize(arr=np.array(name_ds)))
+        # only score plausible names, the rest are as far as they can be,
+        # which they're set to after normalizing so that they don't shift the range
+        scored = np.ones(len(rows), dtype=bool)
+        if index.name_index is not None:
+            name_candidates = index.name_index.get_candidate_rows(search_term)
+            if name_candidates is not None:
+                scored = np.isin(rows, name_candidates, assume_unique=True)
+        if scored.all() and len(rows) == len(index):
+            names = index.processed_names
+        else:
+            names = [index.processed_names[i] for i in rows[scored]]
+        if len(names) > 0:
+            name_ds[scored] = normalize(
+                arr=get_name_distances(
+                    search_term=search_term, doc_strs=names, processed=True
+                )
+            )
 
-    geo_ds = [1.0 for _ in establishments_list]
+    geo_ds = np.ones(len(rows))
     if coords is not None:
-        geo_ds = get_haversine_distances(
-            center_loc=[coords.latitude, coords.longitude],
-            locs=[(e.latitude, e.longitude) for e in establishments_list],
+        geo_ds = get_haversine_distances_from_radians(
+            center_loc=np.radians([coords.latitude, coords.longitude]),
+            latitudes=index.latitudes[rows],
+            longitudes=index.longitudes[rows],
+        )
+        geo_ds = normalize(arr=geo_ds)
+
+    ranked = get_top_k_rows(scores=name_ds + geo_ds, k=limit)
+    return index.get_establishments(rows[ranked])
+
+
+@dataclass
+class SearchCacheStats:
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+
+class SearchCache:
+    # least recently used results of get_relevant_establishments, for one dataset version at a time
+    def __init__(
+        self,
+        max_entries: int = MAX_ENTRIES,
+        ttl_seconds: float = TTL_SECONDS,
+        grid_degrees: float = GRID_DEGREES,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.grid_degrees = grid_degrees
+        self.stats = SearchCacheStats()
+        self.version: Optional[str] = None
+        # key -> (cached at, establishments)
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_quantized_coords(self, coords: Optional[Coords]) -> Optional[Coords]:
+        if coords is None:
+            return None
+        return Coords(
+            latitude=round(coords.latitude / self.grid_degrees) * self.grid_degrees,
+            longitude=round(coords.longitude / self.grid_degrees) * self.grid_degrees,
+        )
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_relevant_establishments(
+        self,
+        dataset: Dataset,
+        coords: Optional[Coords] = None,
+        search_term: Optional[str] = None,
+        limit: Optional[int] = None,
+        radius_km: Optional[float] = None,
+        establishment_filter: Optional[EstablishmentFilter] = None,
+    ) -> List[Establishment]:
+        # results are computed from the normalized key, so hits and misses always agree
+        if search_term is not None:
+            search_term = utils.default_process(search_term) or None
+        coords = self.get_quantized_coords(coords)
+        key = (
+            search_term,
+            None if coords is None else (coords.latitude, coords.longitude),
+            limit,
+            radius_km,
+            establishment_filter,
+        )
+        with self._lock:
+            if dataset.version != self.version:
+                self._entries.clear()
+                self.version = dataset.version
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[0] < self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.stats.hits += 1
+                increment("search_cache.hit")
+                return list(entry[1])
+            self.stats.misses += 1
+            increment("search_cache.miss")
+
+        establishments = get_relevant_establishments(
+            index=dataset.index,
+            coords=coords,
+            search_term=search_term,
+            limit=limit,
+            radius_km=radius_km,
+            establishment_filter=establishment_filter,
         )
-        geo_ds = list(normalize(arr=np.array(geo_ds)))
-
-    ranked = sorted(
-        [
-            (e, name_d, geo_d)
-            for e, name_d, geo_d in zip(establishments_list, name_ds, geo_ds)
-        ],
-        key=lambda i: i[1] + i[2],
-    )
-    return [i[0] for i in ranked]
+        with self._lock:
+            # dataset could have been refreshed while searching
+            if dataset.version == self.version:
+                self._entries[key] = (time.time(), establishments)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return list(establishments)
@@ -0,0 +1,360 @@
+import asyncio
+import hmac
+import json
+import logging
+import math
+import os
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+
+from dinesafe.data.parsed import get_epoch_day, get_latest_dinesafeto_xml
+from dinesafe.data.types import Establishment, Inspection
+from dinesafe.dataset import DatasetStore
+from dinesafe.distances.geo import Coords
+from dinesafe.filters import EstablishmentFilter
+from dinesafe.metrics import METRICS, increment
+from dinesafe.search import SearchCache
+
+logger = logging.getLogger(__name__)
+
+# if set, requests need it in an X-API-Key header
+API_KEY = os.getenv("DINESAFE_API_KEY", None)
+DEFAULT_LIMIT = 25
+MAX_LIMIT = 1000
+KEEP_ALIVE_SECONDS = 30.0
+# for the rest of a request once its first line arrives, so slow clients can't hold
+# a connection open forever by trickling it in
+REQUEST_SECONDS = 10.0
+# how often to pick up new downloads made by the ui process
+REFRESH_SECONDS = 10 * 60
+
+STATUS_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    401: "Unauthorized",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+}
+
+
+def get_inspection_dict(inspection: Inspection) -> dict:
+    return {
+        "status": inspection.status,
+        "date": inspection.date.strftime("%Y-%m-%d"),
+        "infractions": [
+            {
+                "severity": infraction.severity,
+                "deficiency": infraction.deficiency,
+                "action": infraction.action,
+                "court_outcome": infraction.court_outcome,
+                "amount_fined": infraction.amount_fined,
+            }
+            for infraction in inspection.infractions
+        ],
+    }
+
+
+def get_establishment_dict(
+    establishment: Establishment, detailed: bool = False
+) -> dict:
+    summary = establishment.summary
+    d = {
+        "id": establishment.id,
+        "name": establishment.name,
+        "type": establishment.type,
+        "address": establishment.address,
+        "latitude": establishment.latitude,
+        "longitude": establishment.longitude,
+        "latest_status": summary.latest_status,
+        "num_inspections": summary.num_inspections,
+        "num_passed": summary.num_passed,
+    }
+    if detailed:
+        d["inspections"] = [get_inspection_dict(i) for i in establishment.inspections]
+    return d
+
+
+def is_api_key(api_key: str) -> bool:
+    # in constant time, so the key can't be guessed a character at a time, headers
+    # were decoded as latin-1 so this gets back the bytes that were sent
+    return hmac.compare_digest(api_key.encode("latin-1"), API_KEY.encode())
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def get_float_param(params: Dict[str, list], k: str) -> Optional[float]:
+    if k not in params:
+        return None
+    try:
+        v = float(params[k][0])
+    except ValueError:
+        raise HTTPError(400, f"{k} must be a number")
+    # float() also takes inf and nan, which nothing downstream expects
+    if not math.isfinite(v):
+        raise HTTPError(400, f"{k} must be a finite number")
+    return v
+
+
+def get_day_param(params: Dict[str, list], k: str) -> Optional[int]:
+    if k not in params:
+        return None
+    try:
+        return get_epoch_day(params[k][0])
+    except ValueError:
+        raise HTTPError(400, f"{k} must be a YYYY-MM-DD date")
+
+
+def get_establishment_filter(params: Dict[str, list]) -> Optional[EstablishmentFilter]:
+    # repeated params like type=Restaurant&type=Bakery match either
+    establishment_filter = EstablishmentFilter(
+        latest_statuses=tuple(params["status"]) if "status" in params else None,
+        types=tuple(params["type"]) if "type" in params else None,
+        severities=tuple(params["severity"]) if "severity" in params else None,
+        failed_only=params.get("failed", ["false"])[0].lower() == "true",
+        min_latest_day=get_day_param(params, "inspected_since"),
+        max_latest_day=get_day_param(params, "inspected_until"),
+    )
+    return (
+        establishment_filter if establishment_filter != EstablishmentFilter() else None
+    )
+
+
+class SearchService:
+    # serves search and establishment lookups from whatever dataset_store has loaded
+    def __init__(self, dataset_store: DatasetStore):
+        self.dataset_store = dataset_store
+        self.search_cache = SearchCache()
+
+    async def write_response(
+        self,
+        writer: asyncio.StreamWriter,
+        status: int,
+        d: Optional[dict] = None,
+        keep_alive: bool = True,
+    ):
+        body = json.dumps(d if d is not None else {}).encode()
+        await self.write_body(writer, status, body, keep_alive=keep_alive)
+
+    async def write_body(
+        self,
+        writer: asyncio.StreamWriter,
+        status: int,
+        body: bytes,
+        keep_alive: bool = True,
+        content_type: str = "application/json",
+    ):
+        writer.write(
+            (
+                f"HTTP/1.1 {status} {STATUS_REASONS[status]}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+            ).encode()
+            + body
+        )
+        await writer.drain()
+
+    async def write_chunk(self, writer: asyncio.StreamWriter, data: bytes):
+        writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        await writer.drain()
+
+    async def search(
+        self, writer: asyncio.StreamWriter, params: Dict[str, list], keep_alive: bool
+    ):
+        latitude = get_float_param(params, "latitude")
+        longitude = get_float_param(params, "longitude")
+        if (latitude is None) != (longitude is None):
+            raise HTTPError(400, "latitude and longitude go together")
+        limit = get_float_param(params, "limit")
+        limit = DEFAULT_LIMIT if limit is None else int(limit)
+        if not 0 < limit <= MAX_LIMIT:
+            raise HTTPError(400, f"limit must be between 1 and {MAX_LIMIT}")
+        radius_km = get_float_param(params, "radius_km")
+        establishment_filter = get_establishment_filter(params)
+        coords = None
+        if latitude is not None:
+            coords = Coords(latitude=latitude, longitude=longitude)
+        dataset = self.dataset_store.dataset
+        # cpu bound, so kept off the event loop
+        establishments = await asyncio.get_running_loop().run_in_executor(
+            None,
+            lambda: self.search_cache.get_relevant_establishments(
+                dataset=dataset,
+                coords=coords,
+                search_term=params.get("search_term", [None])[0],
+                limit=limit,
+                radius_km=radius_km,
+                establishment_filter=establishment_filter,
+            ),
+        )
+
+        # streamed one establishment at a time as a chunked json array
+        writer.write(
+            (
+                "HTTP/1.1 200 OK\r\n"
+                "Content-Type: application/json\r\n"
+                "Transfer-Encoding: chunked\r\n"
+                f"X-Dataset-Version: {dataset.version}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+            ).encode()
+        )
+        try:
+            await self.write_chunk(writer, b"[")
+            for i, e in enumerate(establishments):
+                prefix = b"," if i > 0 else b""
+                await self.write_chunk(
+                    writer, prefix + json.dumps(get_establishment_dict(e)).encode()
+                )
+            await self.write_chunk(writer, b"]")
+            await self.write_chunk(writer, b"")
+        except Exception:
+            # too late for an error response, so the client sees a truncated body
+            writer.close()
+            raise
+
+    async def handle_request(
+        self, method: str, target: str, headers: Dict[str, str], writer, keep_alive
+    ):
+        if API_KEY is not None and not is_api_key(headers.get("x-api-key", "")):
+            raise HTTPError(401, "missing or wrong X-API-Key")
+        if method != "GET":
+            raise HTTPError(405, f"{method} is not supported")
+        url = urlparse(target)
+        params = parse_qs(url.query)
+        increment("api.requests")
+        if url.path == "/search":
+            await self.search(writer=writer, params=params, keep_alive=keep_alive)
+        elif url.path.startswith("/establishments/"):
+            establishment_id = unquote(url.path[len("/establishments/") :])
+            establishments = self.dataset_store.dataset.establishments
+            if establishment_id not in establishments:
+                raise HTTPError(404, f"No establishment {establishment_id}")
+            d = get_establishment_dict(establishments[establishment_id], detailed=True)
+            await self.write_response(writer, 200, d, keep_alive=keep_alive)
+        elif url.path == "/metrics":
+            # prometheus text format, empty unless DINESAFE_METRICS=true
+            await self.write_body(
+                writer,
+                200,
+                METRICS.to_prometheus().encode(),
+                keep_alive=keep_alive,
+                content_type="text/plain; version=0.0.4",
+            )
+        elif url.path == "/health":
+            stats = self.search_cache.stats
+            d = {
+                "version": self.dataset_store.dataset.version,
+                "search_cache": {
+                    "entries": len(self.search_cache),
+                    "hits": stats.hits,
+                    "misses": stats.misses,
+                    "hit_rate": stats.hit_rate,
+                },
+            }
+            await self.write_response(writer, 200, d, keep_alive=keep_alive)
+        else:
+            raise HTTPError(404, f"No route for {url.path}")
+
+    async def read_request(
+        self, reader: asyncio.StreamReader
+    ) -> Optional[Tuple[str, str, str, Dict[str, str]]]:
+        request_line = await asyncio.wait_for(
+            reader.readline(), timeout=KEEP_ALIVE_SECONDS
+        )
+        if len(request_line) == 0:
+            return None
+        method, target, version = request_line.decode("latin-1").split()
+        headers = await asyncio.wait_for(
+            self.read_headers(reader), timeout=REQUEST_SECONDS
+        )
+        # bodies aren't used, but need to be skipped over to keep the connection usable
+        content_length = int(headers.get("content-length", 0))
+        if content_length > 0:
+            await asyncio.wait_for(
+                reader.readexactly(content_length), timeout=REQUEST_SECONDS
+            )
+        return method, target, version, headers
+
+    async def read_headers(self, reader: asyncio.StreamReader) -> Dict[str, str]:
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if len(line) == 0:
+                return headers
+            k, _, v = line.partition(":")
+            headers[k.strip().lower()] = v.strip()
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        try:
+            while True:
+                request = await self.read_request(reader)
+                if request is None:
+                    break
+                method, target, version, headers = request
+                keep_alive = (
+                    headers.get("connection", "").lower() != "close"
+                    and version == "HTTP/1.1"
+                )
+                try:
+                    await self.handle_request(
+                        method, target, headers, writer, keep_alive=keep_alive
+                    )
+                except HTTPError as e:
+                    await self.write_response(
+                        writer, e.status, {"error": str(e)}, keep_alive=keep_alive
+                    )
+                except Exception:
+                    # still answer unless the response had already started,
+                    # but don't trust the connection afterwards either way
+                    logger.exception(f"Failed to handle {method} {target}")
+                    if not writer.is_closing():
+                        await self.write_response(
+                            writer, 500, {"error": "Internal error"}, keep_alive=False
+                        )
+                    break
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except ValueError as e:
+            logger.error(f"Malformed request: {e}")
+        finally:
+            writer.close()
+
+    async def refresh_periodically(self, refresh_seconds: float = REFRESH_SECONDS):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(refresh_seconds)
+            # a bad download shouldn't stop every later refresh
+            try:
+                await loop.run_in_executor(
+                    None,
+                    lambda: self.dataset_store.refresh(get_latest_dinesafeto_xml()),
+                )
+            except Exception:
+                logger.exception("Failed to refresh the dataset")
+
+
+async def start_server(
+    service: SearchService, host: str = "0.0.0.0", port: int = 8000
+) -> asyncio.AbstractServer:
+    return await asyncio.start_server(service.handle_connection, host=host, port=port)
+
+
+async def serve(dataset_store: DatasetStore, host: str = "0.0.0.0", port: int = 8000):
+    service = SearchService(dataset_store=dataset_store)
+    server = await start_server(service=service, host=host, port=port)
+    refresh_task = asyncio.ensure_future(service.refresh_periodically())
+    logger.info(f"Serving on {host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        refresh_task.cancel()
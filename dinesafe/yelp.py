@@ -1,49 +1,197 @@
 import logging
 import os
-from typing import Optional
-
-import requests
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, List, Optional
+from urllib.parse import quote
 
 from dinesafe.data.types import Establishment
+from dinesafe.metrics import increment, timed
+from dinesafe.yelp_cache import YelpCache
+
+if TYPE_CHECKING:
+    import requests
 
 logger = logging.getLogger(__name__)
 
 
 YELP_API_KEY = os.getenv("YELP_API_KEY", None)
+YELP_API_URL = os.getenv("YELP_API_URL", "https://api.yelp.com/v3")
+YELP_CACHE_PATH = os.getenv("YELP_CACHE_PATH", "yelp_cache.sqlite")
 
+# bounds concurrent requests to yelp and the connections kept alive for them
+MAX_WORKERS = 8
+TIMEOUT_SECONDS = 10.0
+MAX_RETRIES = 3
+BACKOFF_SECONDS = 1.0
+# requests are made while a page renders, so give up rather than wait any longer
+MAX_BACKOFF_SECONDS = 5.0
 
-def get_yelp_biz_search_top_result(establishment: Establishment) -> Optional[dict]:
+_session: Optional["requests.Session"] = None
+_session_lock = threading.Lock()
+_yelp_cache: Optional[YelpCache] = None
+_yelp_cache_lock = threading.Lock()
+
+
+def get_session() -> "requests.Session":
+    # created on first use and shared by all threads, requests is only imported then
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_WORKERS)
+            _session = requests.Session()
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+@timed("yelp.request")
+def get_yelp_response(url: str, params: dict) -> Optional["requests.Response"]:
+    # retries with backoff when rate limited
+    import requests
+
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            response = get_session().get(
+                url=url,
+                headers={
+                    "accept": "application/json",
+                    "Authorization": f"Bearer {YELP_API_KEY}",
+                },
+                params=params,
+                timeout=TIMEOUT_SECONDS,
+            )
+        except requests.RequestException as e:
+            logger.error(f"Request to {url} failed: {e}")
+            return None
+        if response.status_code == 429:
+            increment("yelp.rate_limited")
+        if response.status_code != 429 or attempt == MAX_RETRIES:
+            return response
+        retry_after = response.headers.get("Retry-After")
+        if retry_after is not None and retry_after.isdigit():
+            backoff = float(retry_after)
+            if backoff > MAX_BACKOFF_SECONDS:
+                logger.warning(f"Rate limited by yelp for {backoff}s, giving up")
+                return None
+        else:
+            backoff = min(BACKOFF_SECONDS * 2**attempt, MAX_BACKOFF_SECONDS)
+        logger.warning(f"Rate limited by yelp, retrying in {backoff}s")
+        time.sleep(backoff)
+    return None
+
+
+def get_yelp_biz_search_results(establishment: Establishment) -> Optional[List[dict]]:
+    # None if yelp couldn't be asked, empty if there are no businesses
     if YELP_API_KEY is None:
         logger.error("YELP_API_KEY is None")
+        return None
+    response = get_yelp_response(
+        url=f"{YELP_API_URL}/businesses/search",
+        params={
+            "latitude": establishment.latitude,
+            "longitude": establishment.longitude,
+            "term": establishment.name,
+        },
+    )
+    if response is None:
+        logger.error(f"Received no response for establishment: {establishment}")
+    elif response.status_code != 200:
+        logger.error(f"Received non-200 response: {response}")
     else:
-        response = requests.get(
-            url="https://api.yelp.com/v3/businesses/search",
-            headers={
-                "accept": "application/json",
-                "Authorization": f"Bearer {YELP_API_KEY}",
-            },
-            params={
-                "latitude": establishment.latitude,
-                "longitude": establishment.longitude,
-                "term": establishment.name,
-            },
-        )
-        if response.status_code != 200:
-            logger.error(f"Received non-200 response: {response}")
+        return response.json()["businesses"]
+    return None
+
+
+def get_yelp_biz_search_top_result(establishment: Establishment) -> Optional[dict]:
+    businesses = get_yelp_biz_search_results(establishment=establishment)
+    if businesses is not None:
+        if len(businesses) > 0:
+            top_business_result = businesses[0]
+            return top_business_result
         else:
-            businesses = response.json()["businesses"]
-            if len(businesses) > 0:
-                top_business_result = businesses[0]
-                return top_business_result
-            else:
-                logger.error(
-                    f"Received no business results for establishment: {establishment}"
-                )
+            logger.error(
+                f"Received no business results for establishment: {establishment}"
+            )
     return None
 
 
+def get_yelp_biz_search_top_results(
+    establishments: List[Establishment],
+) -> List[Optional[dict]]:
+    # concurrently, in the same order as establishments
+    if len(establishments) == 0:
+        return []
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(establishments))) as pool:
+        return list(pool.map(get_yelp_biz_search_top_result, establishments))
+
+
+def get_yelp_biz_details(biz_id: str) -> Optional[dict]:
+    if YELP_API_KEY is None:
+        logger.error("YELP_API_KEY is None")
+        return None
+    response = get_yelp_response(
+        url=f"{YELP_API_URL}/businesses/{quote(biz_id, safe='')}", params={}
+    )
+    if response is None or response.status_code != 200:
+        logger.error(f"Failed to get details for business {biz_id}: {response}")
+        return None
+    return response.json()
+
+
+def get_yelp_cache() -> YelpCache:
+    global _yelp_cache
+    with _yelp_cache_lock:
+        if _yelp_cache is None:
+            _yelp_cache = YelpCache(path=YELP_CACHE_PATH)
+        return _yelp_cache
+
+
+def get_yelp_business(
+    establishment: Establishment, cache: Optional[YelpCache] = None
+) -> Optional[dict]:
+    # top business result for establishment, through the cache
+    cache = cache if cache is not None else get_yelp_cache()
+    entry = cache.get(establishment.external_id)
+    if cache.is_fresh(entry):
+        increment("yelp.cache_hit")
+        return entry.details
+    increment("yelp.cache_miss")
+    if entry is not None and cache.is_mapping_fresh(entry):
+        # known business, so only the rating and review count need refreshing
+        details = get_yelp_biz_details(biz_id=entry.biz_id)
+        if details is None:
+            return entry.details
+        cache.put_details(establishment.external_id, details=details)
+        return details
+
+    businesses = get_yelp_biz_search_results(establishment=establishment)
+    if businesses is None:
+        # not cached, this might be temporary
+        return entry.details if entry is not None else None
+    details = businesses[0] if len(businesses) > 0 else None
+    cache.put(establishment.external_id, details=details)
+    return details
+
+
+def get_yelp_businesses(
+    establishments: List[Establishment], cache: Optional[YelpCache] = None
+) -> List[Optional[dict]]:
+    # concurrently, in the same order as establishments
+    if len(establishments) == 0:
+        return []
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(establishments))) as pool:
+        return list(
+            pool.map(lambda e: get_yelp_business(e, cache=cache), establishments)
+        )
+
+
 def get_yelp_biz_id(establishment: Establishment) -> Optional[str]:
-    biz_search_top_result = get_yelp_biz_search_top_result(establishment=establishment)
-    if biz_search_top_result is not None:
-        return biz_search_top_result["id"]
+    business = get_yelp_business(establishment=establishment)
+    if business is not None:
+        return business["id"]
     return None
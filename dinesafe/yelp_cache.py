@@ -0,0 +1,154 @@
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+# establishments rarely change which yelp business they are
+MAPPING_TTL_SECONDS = 30 * 24 * 60 * 60
+# but might show up on yelp later
+NO_MATCH_TTL_SECONDS = 24 * 60 * 60
+# ratings and review counts move a lot faster
+DETAILS_TTL_SECONDS = 24 * 60 * 60
+MAX_ENTRIES = 50000
+
+
+@dataclass
+class YelpCacheEntry:
+    # None if there was no matching business
+    biz_id: Optional[str]
+    mapped_at: float
+    # as returned by yelp, with rating, review_count and url
+    details: Optional[dict]
+    details_at: Optional[float]
+
+
+def get_entry(row: tuple) -> YelpCacheEntry:
+    biz_id, mapped_at, details, details_at = row
+    return YelpCacheEntry(
+        biz_id=biz_id,
+        mapped_at=mapped_at,
+        details=json.loads(details) if details is not None else None,
+        details_at=details_at,
+    )
+
+
+class YelpCache:
+    # keyed by Establishment.external_id, least recently used entries evicted past max_entries
+    def __init__(
+        self,
+        path: str = "yelp_cache.sqlite",
+        max_entries: int = MAX_ENTRIES,
+        mapping_ttl_seconds: float = MAPPING_TTL_SECONDS,
+        no_match_ttl_seconds: float = NO_MATCH_TTL_SECONDS,
+        details_ttl_seconds: float = DETAILS_TTL_SECONDS,
+    ):
+        self.max_entries = max_entries
+        self.mapping_ttl_seconds = mapping_ttl_seconds
+        self.no_match_ttl_seconds = no_match_ttl_seconds
+        self.details_ttl_seconds = details_ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS yelp_businesses (
+                    external_id TEXT PRIMARY KEY,
+                    biz_id TEXT,
+                    mapped_at REAL NOT NULL,
+                    details TEXT,
+                    details_at REAL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS yelp_businesses_accessed_at "
+                "ON yelp_businesses (accessed_at)"
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM yelp_businesses"
+            ).fetchone()[0]
+
+    def get(self, external_id: str) -> Optional[YelpCacheEntry]:
+        with self._lock, self._conn:
+            row = self._select(external_id)
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE yelp_businesses SET accessed_at = ? WHERE external_id = ?",
+                (time.time(), external_id),
+            )
+        return get_entry(row)
+
+    def peek(self, external_id: str) -> Optional[YelpCacheEntry]:
+        # same as get, but without counting as an access, e.g. for checks that
+        # shouldn't keep entries from being evicted
+        with self._lock:
+            row = self._select(external_id)
+        return get_entry(row) if row is not None else None
+
+    def _select(self, external_id: str) -> Optional[tuple]:
+        return self._conn.execute(
+            "SELECT biz_id, mapped_at, details, details_at "
+            "FROM yelp_businesses WHERE external_id = ?",
+            (external_id,),
+        ).fetchone()
+
+    def is_mapping_fresh(self, entry: YelpCacheEntry) -> bool:
+        ttl = (
+            self.mapping_ttl_seconds
+            if entry.biz_id is not None
+            else self.no_match_ttl_seconds
+        )
+        return time.time() - entry.mapped_at < ttl
+
+    def is_details_fresh(self, entry: YelpCacheEntry) -> bool:
+        return (
+            entry.details_at is not None
+            and time.time() - entry.details_at < self.details_ttl_seconds
+        )
+
+    def is_fresh(self, entry: Optional[YelpCacheEntry]) -> bool:
+        # whether entry can be used without asking yelp
+        return (
+            entry is not None
+            and self.is_mapping_fresh(entry)
+            and (entry.biz_id is None or self.is_details_fresh(entry))
+        )
+
+    def put(self, external_id: str, details: Optional[dict]):
+        # details None caches that there's no match
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO yelp_businesses VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    external_id,
+                    details["id"] if details is not None else None,
+                    now,
+                    json.dumps(details) if details is not None else None,
+                    now if details is not None else None,
+                    now,
+                ),
+            )
+            self._conn.execute(
+                "DELETE FROM yelp_businesses WHERE external_id IN ("
+                "SELECT external_id FROM yelp_businesses "
+                "ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def put_details(self, external_id: str, details: dict):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE yelp_businesses SET details = ?, details_at = ?, accessed_at = ? "
+                "WHERE external_id = ?",
+                (json.dumps(details), now, now, external_id),
+            )
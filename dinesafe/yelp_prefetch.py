@@ -0,0 +1,68 @@
+import logging
+import os
+from typing import List, Optional, Tuple
+
+from dinesafe import yelp
+from dinesafe.constants import DEFAULT_LAT_LON
+from dinesafe.data.types import Establishment
+from dinesafe.dataset import Dataset
+from dinesafe.distances.geo import Coords
+from dinesafe.search import get_relevant_establishments
+from dinesafe.yelp import get_yelp_businesses, get_yelp_cache
+from dinesafe.yelp_cache import YelpCache
+
+logger = logging.getLogger(__name__)
+
+# yelp calls allowed per warm up run
+YELP_PREFETCH_BUDGET = int(os.getenv("YELP_PREFETCH_BUDGET", "200"))
+# searches whose results are most likely to be shown, e.g. the landing page
+POPULAR_SEARCHES: List[Tuple[str, Coords]] = [
+    ("", Coords(latitude=DEFAULT_LAT_LON[0], longitude=DEFAULT_LAT_LON[1])),
+]
+
+
+def get_recently_failed(dataset: Dataset) -> List[Establishment]:
+    failed = dataset.index.get_establishments(dataset.index.get_failed_rows())
+    failed.sort(key=lambda e: e.latest_inspection_date, reverse=True)
+    return failed
+
+
+def get_prefetch_establishments(
+    dataset: Dataset,
+    popular_searches: List[Tuple[str, Coords]] = POPULAR_SEARCHES,
+    limit_per_search: int = 25,
+) -> List[Establishment]:
+    # most likely to be shown first, without duplicates
+    establishments = []
+    for search_term, coords in popular_searches:
+        establishments += get_relevant_establishments(
+            index=dataset.index,
+            coords=coords,
+            search_term=search_term,
+            limit=limit_per_search,
+        )
+    establishments += get_recently_failed(dataset)
+    return list({e.id: e for e in establishments}.values())
+
+
+def warm_yelp_cache(
+    dataset: Dataset,
+    budget: int = YELP_PREFETCH_BUDGET,
+    popular_searches: List[Tuple[str, Coords]] = POPULAR_SEARCHES,
+    cache: Optional[YelpCache] = None,
+) -> int:
+    # fetch up to budget establishments that aren't already fresh in the cache
+    if yelp.YELP_API_KEY is None:
+        logger.info("Not warming yelp cache without YELP_API_KEY")
+        return 0
+    cache = cache if cache is not None else get_yelp_cache()
+    to_fetch = []
+    for e in get_prefetch_establishments(dataset, popular_searches=popular_searches):
+        if len(to_fetch) >= budget:
+            break
+        # peeked, so checking doesn't count as a use of what's already cached
+        if not cache.is_fresh(cache.peek(e.external_id)):
+            to_fetch.append(e)
+    get_yelp_businesses(establishments=to_fetch, cache=cache)
+    logger.info(f"Warmed yelp cache for {len(to_fetch)} establishments")
+    return len(to_fetch)
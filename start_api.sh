@@ -0,0 +1 @@
+.venv/bin/python api.py
@@ -0,0 +1,72 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+import pytest
+
+from dinesafe import yelp
+
+
+class FakeYelpHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.num_requests += 1
+            server.num_active += 1
+            server.max_active = max(server.max_active, server.num_active)
+            rate_limited = server.num_rate_limited > 0
+            server.num_rate_limited -= 1
+        time.sleep(0.05)
+        url = urlparse(self.path)
+        term = parse_qs(url.query).get("term", [""])[0]
+        if rate_limited:
+            status, d = 429, {"error": "rate limited"}
+        elif url.path == "/businesses/search":
+            businesses = [] if term == "missing" else [server.get_business(term)]
+            status, d = 200, {"businesses": businesses}
+        elif unquote(url.path).startswith("/businesses/id "):
+            status, d = 200, server.get_business(
+                unquote(url.path)[len("/businesses/id ") :]
+            )
+        else:
+            status, d = 404, {}
+        body = json.dumps(d).encode()
+        self.send_response(status)
+        if rate_limited:
+            self.send_header("Retry-After", server.retry_after)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with server.lock:
+            server.num_active -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_yelp(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeYelpHandler)
+    server.lock = threading.Lock()
+    server.num_requests = server.num_active = server.max_active = 0
+    server.num_rate_limited, server.retry_after = 0, "0"
+    server.get_business = lambda term: {
+        "id": f"id {term}",
+        "rating": 4.5,
+        "review_count": 10,
+        "url": f"https://www.yelp.com/biz/{term}",
+    }
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(yelp, "YELP_API_KEY", "fake")
+    monkeypatch.setattr(
+        yelp, "YELP_API_URL", f"http://127.0.0.1:{server.server_address[1]}"
+    )
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -1,4 +1,6 @@
-from dinesafe.data.types import Establishment, Inspection
+from datetime import datetime
+
+from dinesafe.data.types import Establishment, Infraction, Inspection, to_epoch_day
 
 ESTABLISHMENT_ID = "0"
 ESTABLISHMENT_ID_1 = "1"
@@ -6,28 +8,42 @@ ESTABLISHMENT_ID_1 = "1"
 ESTABLISHMENT_NAME = "establishment_0"
 ESTABLISHMENT_NAME_1 = "establishment_1"
 
+INFRACTION = Infraction(
+    severity="M - Minor",
+    deficiency="deficiency_0",
+    action="Notice to Comply",
+)
+
+INSPECTION = Inspection(
+    status="Pass",
+    day=to_epoch_day(datetime(2022, 1, 1)),
+    infractions=(),
+)
+
+INSPECTION_1 = Inspection(
+    status="Conditional Pass",
+    day=to_epoch_day(datetime(2022, 3, 1)),
+    infractions=(INFRACTION,),
+)
+
 ESTABLISHMENT = Establishment(
-    establishment_id=ESTABLISHMENT_ID,
+    id=ESTABLISHMENT_ID,
     name=ESTABLISHMENT_NAME,
+    type="Restaurant",
     address="address_0",
     latitude=0.0,
     longitude=0.0,
-    updated_timestamp=0.0,
+    status="Pass",
+    inspections=(INSPECTION, INSPECTION_1),
 )
 
 ESTABLISHMENT_1 = Establishment(
-    establishment_id=ESTABLISHMENT_ID_1,
+    id=ESTABLISHMENT_ID_1,
     name=ESTABLISHMENT_NAME_1,
+    type="Bakery",
     address="address_1",
     latitude=0.0,
     longitude=0.0,
-    updated_timestamp=0.0,
-)
-
-INSPECTION = Inspection(
-    inspection_id="1",
-    establishment_id=ESTABLISHMENT_ID,
-    is_pass=True,
-    timestamp=0,
-    updated_timestamp=0.0,
+    status="Pass",
+    inspections=(),
 )
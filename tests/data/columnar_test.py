@@ -0,0 +1,121 @@
+import dataclasses
+import shutil
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import write_synthetic_xml
+from dinesafe.data.columnar import (
+    ColumnarEstablishments,
+    get_columnar_establishments_diff,
+    get_columnar_path,
+    load_columnar,
+    load_columnar_establishments,
+    write_columnar,
+)
+from dinesafe.data.parsed import get_establishments_from_xml
+from dinesafe.data.refresh import get_establishments_diff
+from dinesafe.dataset import DatasetStore, load_dataset
+from dinesafe.distances.geo import Coords
+from dinesafe.index import build_establishment_index
+from dinesafe.search import get_relevant_establishments
+
+OLD_XML = "tests/test_data/dinesafe/1000.01.xml"
+NEW_XML = "tests/test_data/dinesafe/1001.11.xml"
+
+
+@pytest.mark.parametrize(
+    ("path_to_xml", "other_xml"),
+    [
+        pytest.param(OLD_XML, NEW_XML, id="old"),
+        pytest.param(NEW_XML, OLD_XML, id="new"),
+    ],
+)
+def test_load_columnar_establishments(tmp_path, path_to_xml, other_xml):
+    path_to_xml = shutil.copy(path_to_xml, tmp_path)
+    assert load_columnar(path_to_xml) is None
+    expected = get_establishments_from_xml(path_to_xml)
+
+    actual = load_columnar_establishments(path_to_xml)
+    assert isinstance(actual, ColumnarEstablishments)
+    assert list(actual) == list(expected)
+    assert dict(actual) == expected
+    for k, e in expected.items():
+        assert actual[k].summary == e.summary
+    np.testing.assert_array_equal(
+        actual.get_latest_statuses(),
+        [e.summary.latest_status for e in expected.values()],
+    )
+    # mapped, not read into memory
+    assert isinstance(actual.columns["inspection_day"], np.memmap)
+
+    # stale once the source changes
+    shutil.copy(
+        OLD_XML if path_to_xml.endswith(NEW_XML[-11:]) else NEW_XML, path_to_xml
+    )
+    assert load_columnar(path_to_xml) is None
+    assert dict(load_columnar_establishments(path_to_xml)) == (
+        get_establishments_from_xml(path_to_xml)
+    )
+
+
+def test_shared_dataset(tmp_path):
+    path_to_xml = shutil.copy(NEW_XML, tmp_path)
+    dataset = load_dataset(path_to_xml, shared=True)
+    assert dataset.shared
+    coords = Coords(latitude=43.6453, longitude=-79.3806)
+    expected_index = build_establishment_index(
+        get_establishments_from_xml(path_to_xml).values()
+    )
+    np.testing.assert_array_equal(dataset.index.types, expected_index.types)
+    np.testing.assert_array_equal(dataset.index.latest_days, expected_index.latest_days)
+    assert dataset.index.latest_severities == expected_index.latest_severities
+    for search_term in ["", "pizza"]:
+        assert get_relevant_establishments(
+            index=dataset.index, coords=coords, search_term=search_term
+        ) == get_relevant_establishments(
+            index=expected_index, coords=coords, search_term=search_term
+        )
+
+
+def test_shared_dataset_refresh(tmp_path):
+    old_xml = shutil.copy(OLD_XML, tmp_path / "0.xml")
+    new_xml = shutil.copy(NEW_XML, tmp_path / "1.xml")
+    dataset_store = DatasetStore(load_dataset(old_xml, shared=True))
+    assert str(dataset_store.refresh(new_xml)) == "1 added, 0 removed, 1 changed"
+    assert dataset_store.dataset.shared
+    assert get_columnar_path(new_xml) == str(tmp_path / "1.xml.columnar")
+    assert dict(dataset_store.dataset.establishments) == get_establishments_from_xml(
+        new_xml
+    )
+
+
+def test_get_columnar_establishments_diff(tmp_path):
+    old = get_establishments_from_xml(
+        write_synthetic_xml(str(tmp_path / "synthetic.xml"), n=50), workers=1
+    )
+    ids = list(old)
+    new = dict(old)
+    del new[ids[0]]
+    new["added"] = dataclasses.replace(old[ids[1]], id="added")
+    new[ids[2]] = dataclasses.replace(old[ids[2]], name="renamed")
+    e = old[ids[3]]
+    latest = dataclasses.replace(e.inspections[0], day=e.inspections[0].day + 1)
+    new[ids[3]] = dataclasses.replace(e, inspections=(latest,) + e.inspections[1:])
+    e = old[ids[4]]
+    new[ids[4]] = dataclasses.replace(e, inspections=e.inspections + e.inspections)
+    e = old[ids[5]]
+    latest = dataclasses.replace(e.inspections[0], status="Closed!")
+    new[ids[5]] = dataclasses.replace(e, inspections=(latest,) + e.inspections[1:])
+
+    write_columnar(old, path=str(tmp_path / "old"), xml_hash="old")
+    write_columnar(new, path=str(tmp_path / "new"), xml_hash="new")
+    actual = get_columnar_establishments_diff(
+        old=ColumnarEstablishments(str(tmp_path / "old")),
+        new=ColumnarEstablishments(str(tmp_path / "new")),
+    )
+    expected = get_establishments_diff(old=old, new=new)
+    assert actual.removed == expected.removed == [ids[0]]
+    assert actual.added == expected.added == [new["added"]]
+    assert actual.changed == expected.changed
+    assert [e.id for e in actual.changed] == ids[2:6]
@@ -0,0 +1,154 @@
+import gzip
+import os
+import threading
+from glob import glob
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from dinesafe.data.parsed import (
+    PARTIAL_DOWNLOAD_FNAME,
+    download_dinesafeto,
+    get_download_state,
+    get_latest_dinesafeto_xml,
+    write_download_state,
+)
+
+with open("tests/test_data/dinesafe/1000.01.xml", "rb") as f:
+    CONTENT = f.read()
+with open("tests/test_data/dinesafe/1001.11.xml", "rb") as f:
+    NEW_CONTENT = f.read()
+
+
+class FakeDinesafeHandler(BaseHTTPRequestHandler):
+    # served content and etag are set on the server
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        if self.headers.get("If-None-Match") == server.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        body, status = server.content, 200
+        range_header = self.headers.get("Range")
+        content_range = None
+        if range_header is not None and self.headers.get("If-Range") == server.etag:
+            # possibly not where it was asked to start
+            start = int(range_header[len("bytes=") : -1]) + server.range_offset
+            body, status = body[start:], 206
+            content_range = (
+                f"bytes {start}-{len(server.content) - 1}/{len(server.content)}"
+            )
+        self.send_response(status)
+        if content_range is not None:
+            self.send_header("Content-Range", content_range)
+        if "gzip" in self.headers.get("Accept-Encoding", "") and status == 200:
+            body = gzip.compress(body)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("ETag", server.etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeDinesafeHandler)
+    server.content, server.etag, server.requests = CONTENT, '"0"', []
+    server.range_offset = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def get_url(server) -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+def read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_download_dinesafeto(server, tmp_path):
+    path = download_dinesafeto(download_directory=tmp_path, url=get_url(server))
+    assert read(path) == CONTENT
+    assert get_latest_dinesafeto_xml(download_directory=tmp_path) == path
+    assert server.requests[-1]["Accept-Encoding"] == "gzip"
+
+    # not modified
+    assert download_dinesafeto(download_directory=tmp_path, url=get_url(server)) == path
+    assert server.requests[-1]["If-None-Match"] == '"0"'
+
+    # modified, but with the same content
+    server.etag = '"1"'
+    assert download_dinesafeto(download_directory=tmp_path, url=get_url(server)) == path
+    assert get_download_state(tmp_path)["etag"] == '"1"'
+    assert len(glob(os.path.join(tmp_path, "*.xml"))) == 1
+
+    # new content
+    server.content, server.etag = NEW_CONTENT, '"2"'
+    new_path = download_dinesafeto(download_directory=tmp_path, url=get_url(server))
+    assert new_path != path and read(new_path) == NEW_CONTENT
+    assert get_latest_dinesafeto_xml(download_directory=tmp_path) == new_path
+    assert not os.path.exists(os.path.join(tmp_path, PARTIAL_DOWNLOAD_FNAME))
+
+
+def test_download_dinesafeto_resume(server, tmp_path):
+    with open(os.path.join(tmp_path, PARTIAL_DOWNLOAD_FNAME), "wb") as f:
+        f.write(CONTENT[:100])
+    write_download_state(tmp_path, {"partial": {"etag": '"0"'}})
+
+    path = download_dinesafeto(download_directory=tmp_path, url=get_url(server))
+    assert read(path) == CONTENT
+    assert server.requests[-1]["Range"] == "bytes=100-"
+    assert "partial" not in get_download_state(tmp_path)
+
+
+def test_download_dinesafeto_resume_wrong_range(server, tmp_path):
+    with open(os.path.join(tmp_path, PARTIAL_DOWNLOAD_FNAME), "wb") as f:
+        f.write(CONTENT[:100])
+    write_download_state(tmp_path, {"partial": {"etag": '"0"'}})
+    server.range_offset = -100
+
+    path = download_dinesafeto(download_directory=tmp_path, url=get_url(server))
+    # started over rather than appending the overlapping range
+    assert read(path) == CONTENT
+    assert server.requests[-2]["Range"] == "bytes=100-"
+    assert "Range" not in server.requests[-1]
+    assert "partial" not in get_download_state(tmp_path)
+
+
+def test_download_dinesafeto_failed(tmp_path):
+    path = download_dinesafeto(download_directory=tmp_path, url="http://127.0.0.1:1/")
+    assert path is None
+
+
+def test_download_dinesafeto_concurrent(server, tmp_path):
+    # the lock conflicts between threads too, since each one opens its own file
+    paths = []
+    threads = [
+        threading.Thread(
+            target=lambda: paths.append(
+                download_dinesafeto(download_directory=tmp_path, url=get_url(server))
+            )
+        )
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # one download, then conditional requests that weren't modified
+    assert len(set(paths)) == 1 and read(paths[0]) == CONTENT
+    assert len(glob(os.path.join(tmp_path, "*.xml"))) == 1
+    assert sum("If-None-Match" not in r for r in server.requests) == 1
+    assert get_download_state(tmp_path)["path"] == paths[0]
+    assert not glob(os.path.join(tmp_path, "*.tmp"))
@@ -0,0 +1,92 @@
+import os
+import shutil
+import threading
+
+from dinesafe.data.columnar import load_columnar_establishments
+from dinesafe.data.history import (
+    add_xml,
+    compact_history,
+    get_latest_xml,
+    get_manifest,
+    iter_history,
+)
+from dinesafe.data.parsed import get_establishments_from_xml
+from dinesafe.data.snapshot import load_establishments
+
+XMLS = ["tests/test_data/dinesafe/1000.01.xml", "tests/test_data/dinesafe/1001.11.xml"]
+
+
+def test_compact_history(tmp_path):
+    for i in range(5):
+        path = shutil.copy(XMLS[i % 2], tmp_path / f"{i}.xml")
+        load_establishments(path)
+        load_columnar_establishments(path)
+        add_xml(tmp_path, path)
+    assert get_latest_xml(tmp_path) == os.path.join(tmp_path, "4.xml")
+
+    compact_history(tmp_path, keep_latest_n=2)
+    assert get_manifest(tmp_path) == {"xmls": ["3.xml", "4.xml"]}
+    assert sorted(os.listdir(tmp_path)) == [
+        "3.xml",
+        "3.xml.columnar",
+        "3.xml.snapshot",
+        "4.xml",
+        "4.xml.columnar",
+        "4.xml.snapshot",
+        "history.lock",
+        "history.zip",
+        "manifest.json",
+    ]
+    assert get_latest_xml(tmp_path) == os.path.join(tmp_path, "4.xml")
+
+    # nothing lost, oldest first
+    history = [
+        (fname, len(get_establishments_from_xml(f)))
+        for fname, f in iter_history(tmp_path)
+    ]
+    assert history == [
+        ("0.xml", 2),
+        ("1.xml", 3),
+        ("2.xml", 2),
+        ("3.xml", 3),
+        ("4.xml", 2),
+    ]
+
+    # compacting again only archives what's new
+    path = shutil.copy(XMLS[0], tmp_path / "5.xml")
+    add_xml(tmp_path, path)
+    compact_history(tmp_path, keep_latest_n=2)
+    assert [fname for fname, _ in iter_history(tmp_path)] == [
+        f"{i}.xml" for i in range(6)
+    ]
+
+
+def test_get_latest_xml_without_manifest(tmp_path):
+    assert get_latest_xml(tmp_path) is None
+    for i in range(3):
+        shutil.copy(XMLS[0], tmp_path / f"{i}.xml")
+    assert get_latest_xml(tmp_path) == os.path.join(tmp_path, "2.xml")
+
+
+def test_compact_history_concurrent(tmp_path):
+    for i in range(8):
+        add_xml(tmp_path, shutil.copy(XMLS[i % 2], tmp_path / f"{i}.xml"))
+
+    def add_xmls():
+        # downloads come one after another
+        for i in range(8, 10):
+            add_xml(tmp_path, shutil.copy(XMLS[0], tmp_path / f"{i}.xml"))
+
+    # compactions and new downloads at once, each in its own turn
+    threads = [
+        threading.Thread(target=compact_history, args=(tmp_path, 2)) for _ in range(4)
+    ] + [threading.Thread(target=add_xmls)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [fname for fname, _ in iter_history(tmp_path)] == [
+        f"{i}.xml" for i in range(10)
+    ]
+    assert not any(fname.endswith(".tmp") for fname in os.listdir(tmp_path))
@@ -1,6 +1,20 @@
+from datetime import datetime
+
 import pytest
+import xmltodict
 
-from dinesafe.data.parsed import get_establishments_from_xml
+from benchmarks.synthetic import write_synthetic_xml
+from dinesafe.constants import YMD_FORMAT
+from dinesafe.data import parsed
+from dinesafe.data.parsed import (
+    get_epoch_day,
+    get_establishment,
+    get_establishments_from_xml,
+    iter_establishment_chunks,
+    iter_establishments_from_xml,
+)
+from dinesafe.data.types import to_epoch_day
+from dinesafe.index import build_establishment_index
 
 
 @pytest.mark.parametrize(
@@ -15,3 +29,157 @@ def test_get_establishments_from_xml(
 ):
     d = get_establishments_from_xml(path_to_xml=path_to_xml)
     assert len(d) == expected_num_establishments, len(d)
+
+
+@pytest.mark.parametrize(
+    "path_to_xml",
+    [
+        pytest.param("tests/test_data/dinesafe/1001.11.xml", id="new"),
+        pytest.param("tests/test_data/dinesafe/1000.01.xml", id="old"),
+    ],
+)
+def test_iter_establishments_from_xml(path_to_xml: str):
+    with open(path_to_xml) as f:
+        expected = [
+            get_establishment(d)
+            for d in xmltodict.parse(f.read())["DINESAFE_DATA"]["ESTABLISHMENT"]
+        ]
+    assert list(iter_establishments_from_xml(path_to_xml=path_to_xml)) == expected
+
+
+@pytest.mark.parametrize(
+    "ymd", ["2022-05-26", "1970-01-01", "1969-12-31", "2000-02-29"]
+)
+def test_get_epoch_day(ymd: str):
+    assert get_epoch_day(ymd) == to_epoch_day(datetime.strptime(ymd, YMD_FORMAT))
+
+
+def test_get_epoch_day_invalid():
+    with pytest.raises(ValueError):
+        get_epoch_day("2022-02-30")
+
+
+@pytest.mark.parametrize("chunk_bytes", [1, 1000, 1 << 20])
+def test_iter_establishment_chunks(chunk_bytes: int):
+    path_to_xml = "tests/test_data/dinesafe/1001.11.xml"
+    chunks = list(iter_establishment_chunks(path_to_xml, chunk_bytes=chunk_bytes))
+    assert all(c.startswith(b"<ESTABLISHMENT>") for c in chunks)
+    assert all(c.endswith(b"</ESTABLISHMENT>") for c in chunks)
+    assert sum(c.count(b"<ESTABLISHMENT>") for c in chunks) == 3
+
+
+@pytest.fixture
+def parallel(monkeypatch):
+    # small enough that the test files have several chunks
+    monkeypatch.setattr(parsed, "CHUNK_BYTES", 1000)
+
+
+@pytest.mark.parametrize(
+    "path_to_xml",
+    [
+        pytest.param("tests/test_data/dinesafe/1001.11.xml", id="new"),
+        pytest.param("tests/test_data/dinesafe/1000.01.xml", id="old"),
+    ],
+)
+def test_get_establishments_from_xml_parallel(parallel, path_to_xml: str):
+    expected = get_establishments_from_xml(path_to_xml, workers=1)
+    actual = get_establishments_from_xml(path_to_xml, workers=2)
+    assert list(actual.items()) == list(expected.items())
+    # strings sent back from workers are interned again
+    for e in actual.values():
+        assert e.type is expected[e.id].type
+        for i, expected_i in zip(e.inspections, expected[e.id].inspections):
+            assert i.status is expected_i.status
+        assert e.summary.latest_status is expected[e.id].summary.latest_status
+
+
+@pytest.mark.parametrize(
+    ("affinity", "expected"),
+    [
+        pytest.param({0}, 1, id="one"),
+        pytest.param({0, 1}, 2, id="few"),
+        pytest.param(set(range(64)), parsed.MAX_DEFAULT_PARSE_WORKERS, id="many"),
+    ],
+)
+def test_get_default_parse_workers(monkeypatch, affinity, expected):
+    # by the cpus this process may use rather than all of them
+    monkeypatch.setattr(
+        parsed.os, "sched_getaffinity", lambda pid: affinity, raising=False
+    )
+    monkeypatch.setattr(parsed.os, "cpu_count", lambda: 128)
+    assert parsed.get_default_parse_workers() == expected
+
+
+def test_iter_establishments_from_xml_in_parallel_bounded(monkeypatch, tmp_path):
+    path_to_xml = write_synthetic_xml(str(tmp_path / "synthetic.xml"), n=50)
+    num_chunks_read = []
+    iter_chunks = parsed.iter_establishment_chunks
+
+    def iter_counted_chunks(*args, **kwargs):
+        for i, chunk in enumerate(iter_chunks(*args, **kwargs)):
+            num_chunks_read.append(i + 1)
+            yield chunk
+
+    monkeypatch.setattr(parsed, "iter_establishment_chunks", iter_counted_chunks)
+    establishments = parsed.iter_establishments_from_xml_in_parallel(
+        path_to_xml, workers=1, chunk_bytes=1000
+    )
+    next(establishments)
+    # the rest of the file isn't read until it's needed
+    assert num_chunks_read[-1] == 2
+    assert len(list(establishments)) == 49
+    assert num_chunks_read[-1] > 2
+
+
+def test_get_establishments_from_xml_parallel_duplicate_ids(parallel, tmp_path):
+    with open("tests/test_data/dinesafe/1001.11.xml", "rb") as f:
+        content = f.read()
+    start = content.index(b"<ESTABLISHMENT>")
+    end = content.index(b"</ESTABLISHMENT>") + len(b"</ESTABLISHMENT>")
+    path_to_xml = tmp_path / "duplicate.xml"
+    path_to_xml.write_bytes(content[:end] + content[start:])
+    with pytest.raises(KeyError):
+        get_establishments_from_xml(str(path_to_xml), workers=2)
+
+
+def test_get_establishments_from_xml_parallel_blank_fields(parallel, tmp_path):
+    with open("tests/test_data/dinesafe/1001.11.xml", "rb") as f:
+        content = f.read()
+    # blank type and status of the first establishment
+    for tag in [b"TYPE", b"STATUS"]:
+        start = content.index(b"<" + tag + b">") + len(tag) + 2
+        end = content.index(b"</" + tag + b">")
+        content = content[:start] + content[end:]
+    path_to_xml = tmp_path / "blank.xml"
+    path_to_xml.write_bytes(content)
+    expected = get_establishments_from_xml(str(path_to_xml), workers=1)
+    assert sum(e.type is None for e in expected.values()) == 1
+    assert sum(e.status is None for e in expected.values()) == 1
+    assert get_establishments_from_xml(str(path_to_xml), workers=2) == expected
+
+
+def test_get_establishments_from_xml_blank_inspection_status():
+    d = get_establishments_from_xml("tests/test_data/blank_fields.xml")
+    e = d["1"]
+    assert e.inspections[0].status is None
+    # blank isn't a pass, but doesn't stop anything else from loading
+    assert e.passed_most_recent_inspection is False
+    assert e.summary.pass_sequence == (False, True)
+    assert d["2"].passed_most_recent_inspection is True
+    index = build_establishment_index(d.values())
+    assert index.get_failed_rows().tolist() == [index.rows_by_id["1"]]
+
+
+def test_get_establishments_from_xml_blank_inspection_date():
+    d = get_establishments_from_xml("tests/test_data/blank_fields.xml")
+    # skipped, the rest of the establishment is kept
+    assert len(d["2"].inspections) == 1
+    assert d["2"].inspections[0].date == datetime(2022, 11, 21)
+    assert d["2"].passed_most_recent_inspection is True
+
+
+def test_get_establishments_from_synthetic_xml(parallel, tmp_path):
+    path_to_xml = write_synthetic_xml(str(tmp_path / "synthetic.xml"), n=50)
+    expected = get_establishments_from_xml(path_to_xml, workers=1)
+    assert len(expected) == 50
+    assert get_establishments_from_xml(path_to_xml, workers=2) == expected
@@ -0,0 +1,27 @@
+import dataclasses
+
+from dinesafe.data.parsed import get_establishments_from_xml
+from dinesafe.data.refresh import get_establishments_diff
+
+ESTABLISHMENTS = get_establishments_from_xml("tests/test_data/dinesafe/1001.11.xml")
+
+
+def test_get_establishments_diff_infraction_details():
+    k = next(iter(ESTABLISHMENTS))
+    e = ESTABLISHMENTS[k]
+    inspection = e.inspections[0]
+    infraction = dataclasses.replace(inspection.infractions[0], court_outcome="Guilty")
+    new = dict(ESTABLISHMENTS)
+    new[k] = dataclasses.replace(
+        e,
+        inspections=(
+            dataclasses.replace(
+                inspection, infractions=(infraction,) + inspection.infractions[1:]
+            ),
+        )
+        + e.inspections[1:],
+    )
+    assert len(get_establishments_diff(old=ESTABLISHMENTS, new=ESTABLISHMENTS)) == 0
+    diff = get_establishments_diff(old=ESTABLISHMENTS, new=new)
+    assert diff.changed == [new[k]]
+    assert len(diff.added) == 0 and len(diff.removed) == 0
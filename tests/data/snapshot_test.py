@@ -0,0 +1,26 @@
+import os
+import shutil
+
+from dinesafe.data.parsed import get_establishments_from_xml
+from dinesafe.data.snapshot import get_snapshot_path, load_establishments, load_snapshot
+
+PATH_TO_XML = "tests/test_data/dinesafe/1001.11.xml"
+
+
+def test_load_establishments(tmp_path):
+    path_to_xml = shutil.copy(PATH_TO_XML, tmp_path)
+    assert load_snapshot(path_to_xml) is None
+
+    expected = get_establishments_from_xml(path_to_xml)
+    assert load_establishments(path_to_xml) == expected
+    assert os.path.isfile(get_snapshot_path(path_to_xml))
+    assert load_snapshot(path_to_xml) == expected
+
+
+def test_load_snapshot_stale(tmp_path):
+    path_to_xml = shutil.copy(PATH_TO_XML, tmp_path)
+    load_establishments(path_to_xml)
+    # snapshot is keyed by content, so a changed source must not reuse it
+    shutil.copy("tests/test_data/dinesafe/1000.01.xml", path_to_xml)
+    assert load_snapshot(path_to_xml) is None
+    assert load_establishments(path_to_xml) == get_establishments_from_xml(path_to_xml)
@@ -0,0 +1,94 @@
+import dataclasses
+import pickle
+from datetime import datetime
+
+import pytest
+
+from dinesafe.data.types import Establishment, Inspection, to_epoch_day
+from tests.constants import ESTABLISHMENT, ESTABLISHMENT_1, INFRACTION
+
+INSPECTIONS = [
+    Inspection(status="Pass", day=to_epoch_day(datetime(2022, 1, 1)), infractions=()),
+    Inspection(
+        status="Conditional Pass",
+        day=to_epoch_day(datetime(2022, 3, 1)),
+        infractions=(),
+    ),
+    Inspection(status="Pass", day=to_epoch_day(datetime(2022, 2, 1)), infractions=()),
+]
+
+
+def get_establishment(inspections) -> Establishment:
+    return Establishment(
+        id="0",
+        name="establishment_0",
+        type="Restaurant",
+        address="address_0",
+        latitude=0.0,
+        longitude=0.0,
+        status="Pass",
+        inspections=inspections,
+    )
+
+
+def test_establishment_summary():
+    establishment = get_establishment(INSPECTIONS)
+    assert establishment.inspections_latest_first == (
+        INSPECTIONS[1],
+        INSPECTIONS[2],
+        INSPECTIONS[0],
+    )
+    summary = establishment.summary
+    assert summary.latest_inspection == INSPECTIONS[1]
+    assert summary.latest_status == "Conditional Pass"
+    assert (summary.num_passed, summary.num_inspections) == (2, 3)
+    assert summary.pass_sequence == (False, True, True)
+    assert establishment.latest_inspection_date == datetime(2022, 3, 1)
+    assert establishment.passed_most_recent_inspection is False
+
+
+def test_establishment_inspections_by_date():
+    # the layout inspections had before it became a sorted tuple
+    inspections_by_date = {}
+    for inspection in INSPECTIONS:
+        inspections_by_date.setdefault(inspection.date, []).append(inspection)
+    establishment = get_establishment(inspections_by_date)
+    assert establishment == get_establishment(INSPECTIONS)
+    assert establishment.inspections_by_date == inspections_by_date
+    assert max(establishment.inspections_by_date) == datetime(2022, 3, 1)
+    assert INFRACTION.conviction_date is None
+    assert dataclasses.replace(
+        INFRACTION, conviction_day=to_epoch_day(datetime(2022, 4, 1))
+    ).conviction_date == datetime(2022, 4, 1)
+
+
+def test_establishment_summary_no_inspections():
+    establishment = get_establishment([])
+    assert establishment.summary.num_inspections == 0
+    assert establishment.summary.pass_proportion is None
+    assert establishment.latest_inspection_date is None
+    assert establishment.passed_most_recent_inspection is None
+
+
+def test_establishment_is_compact():
+    establishment = get_establishment(INSPECTIONS)
+    assert not hasattr(establishment, "__dict__")
+    assert not hasattr(INSPECTIONS[0], "__dict__")
+    assert INSPECTIONS[1].date == datetime(2022, 3, 1)
+    # slots still pickle, which snapshots rely on
+    unpickled = pickle.loads(pickle.dumps(establishment))
+    assert unpickled == establishment
+    assert unpickled.summary.pass_sequence == establishment.summary.pass_sequence
+
+
+@pytest.mark.parametrize(
+    "establishment",
+    [
+        pytest.param(ESTABLISHMENT, id="with_inspections"),
+        pytest.param(ESTABLISHMENT_1, id="without_inspections"),
+    ],
+)
+def test_establishment_pickle(establishment: Establishment):
+    unpickled = pickle.loads(pickle.dumps(establishment))
+    assert unpickled == establishment
+    assert unpickled.summary == establishment.summary
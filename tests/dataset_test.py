@@ -0,0 +1,34 @@
+import shutil
+
+import pytest
+
+from dinesafe.data.parsed import get_establishments_from_xml
+from dinesafe.dataset import DatasetStore, load_dataset
+
+OLD_XML = "tests/test_data/dinesafe/1000.01.xml"
+NEW_XML = "tests/test_data/dinesafe/1001.11.xml"
+
+
+@pytest.mark.parametrize(
+    ("old_xml", "new_xml", "expected_diff"),
+    [
+        pytest.param(OLD_XML, NEW_XML, "1 added, 0 removed, 1 changed", id="forward"),
+        pytest.param(NEW_XML, OLD_XML, "0 added, 1 removed, 1 changed", id="backward"),
+        pytest.param(OLD_XML, OLD_XML, "0 added, 0 removed, 0 changed", id="same"),
+    ],
+)
+@pytest.mark.parametrize(
+    "shared", [pytest.param(False, id="unshared"), pytest.param(True, id="shared")]
+)
+def test_dataset_store_refresh(tmp_path, old_xml, new_xml, expected_diff, shared):
+    old_xml = shutil.copy(old_xml, tmp_path / "0.xml")
+    new_xml = shutil.copy(new_xml, tmp_path / "1.xml")
+    dataset_store = DatasetStore(load_dataset(old_xml, shared=shared))
+
+    diff = dataset_store.refresh(new_xml)
+    assert str(diff) == expected_diff
+    assert dataset_store.refresh(new_xml) is None
+
+    dataset = dataset_store.dataset
+    assert dataset.version == "1.xml"
+    assert dict(dataset.establishments) == get_establishments_from_xml(new_xml)
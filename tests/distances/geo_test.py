@@ -0,0 +1,81 @@
+from math import asin, cos, radians, sin, sqrt
+
+import numpy as np
+import pytest
+
+from dinesafe.distances.geo import (
+    EARTH_RADIUS_KM,
+    Coords,
+    build_geo_index,
+    get_haversine_distances,
+    get_haversine_distances_from_radians,
+)
+
+CENTER = Coords(latitude=43.6453, longitude=-79.3806)
+
+RNG = np.random.default_rng(0)
+LAT_LONS = np.column_stack(
+    (RNG.uniform(43.5, 43.9, size=2000), RNG.uniform(-79.7, -79.1, size=2000))
+)
+GEO_INDEX = build_geo_index(
+    latitudes=np.radians(LAT_LONS[:, 0]), longitudes=np.radians(LAT_LONS[:, 1])
+)
+DISTANCES_KM = EARTH_RADIUS_KM * get_haversine_distances(
+    (CENTER.latitude, CENTER.longitude), LAT_LONS
+)
+
+
+def get_expected_haversine_distance(lat1, lon1, lat2, lon2) -> float:
+    lat1, lon1, lat2, lon2 = map(radians, (lat1, lon1, lat2, lon2))
+    a = (
+        sin((lat2 - lat1) / 2) ** 2
+        + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * asin(sqrt(a))
+
+
+def test_get_haversine_distances():
+    expected = [
+        get_expected_haversine_distance(CENTER.latitude, CENTER.longitude, lat, lon)
+        for lat, lon in LAT_LONS[:100]
+    ]
+    np.testing.assert_allclose(
+        DISTANCES_KM[:100], EARTH_RADIUS_KM * np.array(expected), rtol=1e-9
+    )
+    # antipodal points are half the circumference apart
+    np.testing.assert_allclose(
+        get_haversine_distances((0.0, 0.0), [(0.0, 180.0)]), [np.pi]
+    )
+
+
+def test_get_haversine_distances_from_radians_batch():
+    centers = np.radians(LAT_LONS[:5])
+    latitudes, longitudes = np.radians(LAT_LONS[:, 0]), np.radians(LAT_LONS[:, 1])
+    distances = get_haversine_distances_from_radians(
+        center_loc=centers, latitudes=latitudes, longitudes=longitudes
+    )
+    assert distances.shape == (5, len(LAT_LONS))
+    for center, row in zip(centers, distances):
+        np.testing.assert_allclose(
+            row,
+            get_haversine_distances_from_radians(
+                center_loc=center, latitudes=latitudes, longitudes=longitudes
+            ),
+        )
+    np.testing.assert_allclose(np.diag(distances[:, :5]), 0.0, atol=1e-12)
+
+
+@pytest.mark.parametrize("km", [0.1, 1.0, 5.0, 50.0])
+def test_within_radius(km: float):
+    np.testing.assert_array_equal(
+        GEO_INDEX.within_radius(coords=CENTER, km=km),
+        np.flatnonzero(DISTANCES_KM <= km),
+    )
+
+
+@pytest.mark.parametrize("k", [1, 10, 100, 2000, 5000])
+def test_nearest(k: int):
+    np.testing.assert_array_equal(
+        GEO_INDEX.nearest(coords=CENTER, k=k),
+        np.argsort(DISTANCES_KM, kind="stable")[:k],
+    )
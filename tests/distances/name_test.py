@@ -0,0 +1,50 @@
+import pytest
+from rapidfuzz import fuzz, utils
+
+from dinesafe.distances.name import (
+    build_name_index,
+    get_name_distances,
+    get_processed_names,
+)
+
+DOC_STRS = [
+    "# HASHTAG INDIA RESTAURANT",
+    "PIZZA PIZZA",
+    "Pizzeria Libretto",
+    "TIM HORTONS",
+    "Tim Horton's #1234",
+    "",
+]
+
+
+@pytest.mark.parametrize("search_term", ["pizza", "tim hortons", "India", "!!"])
+@pytest.mark.parametrize("processed", [True, False])
+def test_get_name_distances(search_term: str, processed: bool):
+    expected = [
+        1.0 - fuzz.WRatio(search_term, s, processor=utils.default_process) / 100.0
+        for s in DOC_STRS
+    ]
+    doc_strs = get_processed_names(DOC_STRS) if processed else DOC_STRS
+    actual = get_name_distances(
+        search_term=search_term, doc_strs=doc_strs, processed=processed
+    )
+    assert list(actual) == expected
+
+
+@pytest.mark.parametrize(
+    ("search_term", "expected_rows"),
+    [
+        pytest.param("pizza", [1, 2], id="token and trigrams"),
+        pytest.param("piza", [1, 2], id="typo"),
+        pytest.param("tim hort", [3, 4], id="prefix"),
+        pytest.param("zzzzzz", [], id="no match"),
+        pytest.param("ti", None, id="too short"),
+    ],
+)
+def test_name_index_get_candidate_rows(search_term, expected_rows):
+    name_index = build_name_index(get_processed_names(DOC_STRS))
+    actual = name_index.get_candidate_rows(search_term)
+    if expected_rows is None:
+        assert actual is None
+    else:
+        assert list(actual) == expected_rows
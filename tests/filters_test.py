@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+
+from dinesafe.data.columnar import MISSING_DAY
+from dinesafe.data.parsed import get_establishments_from_xml
+from dinesafe.filters import EstablishmentFilter, build_filter_index, intersect_sorted
+from dinesafe.index import build_establishment_index
+from dinesafe.search import get_relevant_establishments
+
+RNG = np.random.default_rng(0)
+N = 5000
+STATUSES = np.array(["Pass", "Conditional Pass", "Closed", None], dtype=object)
+TYPES = np.array(["Restaurant", "Bakery", "Food Take Out"], dtype=object)
+SEVERITIES = ["M - Minor", "S - Significant", "C - Crucial"]
+LATEST_STATUSES = STATUSES[RNG.integers(len(STATUSES), size=N)]
+ESTABLISHMENT_TYPES = TYPES[RNG.integers(len(TYPES), size=N)]
+LATEST_SEVERITIES = [
+    tuple(sorted(set(RNG.choice(SEVERITIES, size=RNG.integers(3))))) for _ in range(N)
+]
+LATEST_DAYS = np.where(
+    np.equal(LATEST_STATUSES, None),
+    MISSING_DAY,
+    RNG.integers(19000, 19500, size=N),
+).astype(np.int32)
+FILTER_INDEX = build_filter_index(
+    latest_statuses=LATEST_STATUSES,
+    types=ESTABLISHMENT_TYPES,
+    latest_severities=LATEST_SEVERITIES,
+    latest_days=LATEST_DAYS,
+)
+
+
+def is_match(i: int, f: EstablishmentFilter) -> bool:
+    # plain python version of FilterIndex.get_rows
+    status = LATEST_STATUSES[i]
+    day = LATEST_DAYS[i]
+    return (
+        (f.latest_statuses is None or status in f.latest_statuses)
+        and (f.types is None or ESTABLISHMENT_TYPES[i] in f.types)
+        and (
+            f.severities is None
+            or len(set(LATEST_SEVERITIES[i]) & set(f.severities)) > 0
+        )
+        and (not f.failed_only or (status is not None and status.lower() != "pass"))
+        and (
+            f.min_latest_day is None or (day != MISSING_DAY and day >= f.min_latest_day)
+        )
+        and (
+            f.max_latest_day is None or (day != MISSING_DAY and day <= f.max_latest_day)
+        )
+    )
+
+
+@pytest.mark.parametrize(
+    "establishment_filter",
+    [
+        pytest.param(EstablishmentFilter(failed_only=True), id="failed"),
+        pytest.param(EstablishmentFilter(types=("Bakery", "Nowhere")), id="types"),
+        pytest.param(EstablishmentFilter(latest_statuses=("Closed",)), id="statuses"),
+        pytest.param(
+            EstablishmentFilter(severities=("C - Crucial", "S - Significant")),
+            id="severities",
+        ),
+        pytest.param(EstablishmentFilter(min_latest_day=19470), id="recent"),
+        pytest.param(
+            EstablishmentFilter(
+                failed_only=True,
+                types=("Restaurant",),
+                min_latest_day=19100,
+                max_latest_day=19200,
+            ),
+            id="combined",
+        ),
+    ],
+)
+def test_filter_index_get_rows(establishment_filter: EstablishmentFilter):
+    np.testing.assert_array_equal(
+        FILTER_INDEX.get_rows(establishment_filter),
+        [i for i in range(N) if is_match(i, establishment_filter)],
+    )
+
+
+def test_filter_index_no_filter():
+    assert FILTER_INDEX.get_rows(EstablishmentFilter()) is None
+
+
+def test_intersect_sorted():
+    a = np.array([1, 3, 5, 7, 9])
+    b = np.array([0, 3, 4, 9, 10])
+    np.testing.assert_array_equal(intersect_sorted(a, b), [3, 9])
+    np.testing.assert_array_equal(intersect_sorted(a, b[:0]), [])
+
+
+def test_get_relevant_establishments_filtered():
+    establishments = get_establishments_from_xml("tests/test_data/dinesafe/1001.11.xml")
+    index = build_establishment_index(establishments.values())
+    failed = get_relevant_establishments(
+        index=index,
+        search_term="pizza",
+        establishment_filter=EstablishmentFilter(failed_only=True),
+    )
+    assert failed == [
+        e
+        for e in get_relevant_establishments(index=index, search_term="pizza")
+        if e.passed_most_recent_inspection is False
+    ]
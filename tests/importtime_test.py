@@ -0,0 +1,83 @@
+import os
+import subprocess
+import sys
+from typing import Dict
+
+import pytest
+
+# streamlit has to be imported regardless, so it's imported before timing anything
+PRELOADED_MODULES = ["streamlit", "streamlit_js_eval"]
+# what app.py imports on every rerun
+APP_MODULES = [
+    "dinesafe.constants",
+    "dinesafe.data.history",
+    "dinesafe.data.parsed",
+    "dinesafe.dataset",
+    "dinesafe.distances.geo",
+    "dinesafe.search",
+    "dinesafe.yelp_prefetch",
+    "views.map_results",
+    "views.search_results",
+]
+# only needed on specific paths, so should not be imported up front
+LAZY_MODULES = [
+    "apscheduler",
+    "requests",
+    "xml.etree.ElementTree",
+]
+IMPORT_BUDGET_MS = float(os.getenv("DINESAFE_IMPORT_BUDGET_MS", "500"))
+
+
+def get_import_times_us(code: str) -> Dict[str, Dict[str, int]]:
+    # module -> self and cumulative import times in microseconds and nesting depth,
+    # from python -X importtime
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    import_times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:") :].split("|")
+        import_times[module.strip()] = {
+            "self": int(self_us),
+            "cumulative": int(cumulative_us),
+            # nested imports are indented by 2 more spaces per level
+            "depth": (len(module) - len(module.lstrip()) - 1) // 2,
+        }
+    return import_times
+
+
+@pytest.fixture(scope="module")
+def app_import_times() -> Dict[str, Dict[str, int]]:
+    preload = "; ".join(f"import {m}" for m in PRELOADED_MODULES)
+    return get_import_times_us(
+        "; ".join([preload] + [f"import {m}" for m in APP_MODULES])
+    )
+
+
+def test_lazy_modules_not_imported(app_import_times):
+    imported = [m for m in LAZY_MODULES if m in app_import_times]
+    assert imported == [], f"{imported} imported by {APP_MODULES}"
+
+
+def test_import_time_budget(app_import_times):
+    preloaded = get_import_times_us("; ".join(f"import {m}" for m in PRELOADED_MODULES))
+    # top level entries are imports made directly by the -c code, anything new is on us
+    new_top_level = {
+        m: t
+        for m, t in app_import_times.items()
+        if t["depth"] == 0 and m not in preloaded
+    }
+    total_ms = sum(t["cumulative"] for t in new_top_level.values()) / 1000
+    slowest = sorted(
+        (t["self"] / 1000, m) for m, t in app_import_times.items() if m not in preloaded
+    )[::-1][:10]
+    report = "\n".join(f"{ms:8.1f}ms {m}" for ms, m in slowest)
+    assert total_ms < IMPORT_BUDGET_MS, (
+        f"Importing {APP_MODULES} took {total_ms:.0f}ms, over the "
+        f"{IMPORT_BUDGET_MS:.0f}ms budget. Slowest imports:\n{report}"
+    )
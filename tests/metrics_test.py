@@ -0,0 +1,86 @@
+import pytest
+
+from dinesafe import metrics
+from dinesafe.data.parsed import get_establishments_from_xml
+from dinesafe.distances.geo import Coords
+from dinesafe.index import build_establishment_index
+from dinesafe.metrics import (
+    METRICS,
+    Breakdown,
+    Stage,
+    increment,
+    timed,
+    write_prometheus,
+)
+from dinesafe.search import get_relevant_establishments
+
+
+@timed("test.add")
+def add(a: int, b: int) -> int:
+    return a + b
+
+
+@pytest.fixture
+def enabled():
+    metrics.set_enabled(True)
+    METRICS.reset()
+    yield
+    metrics.set_enabled(False)
+    METRICS.reset()
+
+
+def test_disabled():
+    METRICS.reset()
+    assert add(1, 2) == 3
+    increment("test.event")
+    with Stage("test.block"):
+        pass
+    assert METRICS.stages == {}
+    assert METRICS.counters == {}
+
+
+def test_enabled(enabled):
+    assert add(1, 2) == 3
+    assert add(3, 4) == 7
+    increment("test.event", 2)
+    with Stage("test.block"):
+        pass
+    assert METRICS.stages["test.add"].count == 2
+    assert METRICS.stages["test.block"].count == 1
+    assert METRICS.counters == {"test.event": 2}
+    text = METRICS.to_prometheus()
+    assert 'dinesafe_stage_seconds_count{stage="test.add"} 2' in text
+    assert 'dinesafe_events_total{event="test.event"} 2' in text
+
+
+def test_write_prometheus(enabled, tmp_path):
+    add(1, 2)
+    path = tmp_path / "dinesafe.prom"
+    write_prometheus(str(path))
+    assert path.read_text() == METRICS.to_prometheus()
+
+
+def test_breakdown():
+    establishments = get_establishments_from_xml("tests/test_data/dinesafe/1001.11.xml")
+    index = build_establishment_index(establishments.values())
+    # recorded for the request even with metrics disabled
+    with Breakdown("test") as breakdown:
+        get_relevant_establishments(
+            index=index,
+            coords=Coords(latitude=43.6453, longitude=-79.3806),
+            search_term="india restaurant",
+        )
+    totals = breakdown.get_totals()
+    for stage in [
+        "search.total",
+        "search.name_distances",
+        "search.geo_distances",
+        "search.top_k",
+    ]:
+        assert totals[stage].count == 1
+    assert breakdown.total_seconds >= totals["search.total"].total_seconds
+    assert set(breakdown.to_dict()["stages"]) == set(totals)
+
+    with Breakdown("test", enabled=False) as breakdown:
+        add(1, 2)
+    assert breakdown.stages == []
@@ -0,0 +1,205 @@
+from typing import List, Optional, Set
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import write_synthetic_xml
+from dinesafe.data.parsed import get_establishments_from_xml
+from dinesafe.data.types import Establishment
+from dinesafe.dataset import Dataset
+from dinesafe.distances.geo import Coords, get_haversine_distances
+from dinesafe.distances.name import get_name_distances
+from dinesafe.index import build_establishment_index
+from dinesafe.search import SearchCache, get_relevant_establishments, get_top_k_rows
+
+ESTABLISHMENTS = list(
+    get_establishments_from_xml("tests/test_data/dinesafe/1001.11.xml").values()
+)
+
+
+def get_expected_ranking(
+    coords: Optional[Coords],
+    search_term: Optional[str],
+    name_candidates: Optional[Set[int]] = None,
+    establishments: List[Establishment] = ESTABLISHMENTS,
+) -> List[Establishment]:
+    # plain python version of the ranking, on top of the unnormalized distances,
+    # names outside of name_candidates (if any) are as far as they can be
+    def rescale(l):
+        lo, hi = min(l), max(l)
+        return [(v - lo) / (hi - lo) if hi > lo else v for v in l]
+
+    name_ds = [1.0 for _ in establishments]
+    if search_term:
+        rows = [
+            i
+            for i in range(len(establishments))
+            if name_candidates is None or i in name_candidates
+        ]
+        if len(rows) > 0:
+            scored = rescale(
+                get_name_distances(search_term, [establishments[i].name for i in rows])
+            )
+            for i, d in zip(rows, scored):
+                name_ds[i] = d
+    geo_ds = [1.0 for _ in establishments]
+    if coords is not None:
+        geo_ds = rescale(
+            get_haversine_distances(
+                (coords.latitude, coords.longitude),
+                [(e.latitude, e.longitude) for e in establishments],
+            )
+        )
+    ranked = sorted(
+        zip(establishments, name_ds, geo_ds), key=lambda i: float(i[1] + i[2])
+    )
+    return [i[0] for i in ranked]
+
+
+@pytest.mark.parametrize(
+    ("coords", "search_term"),
+    [
+        pytest.param(None, None, id="none"),
+        pytest.param(None, "india", id="name"),
+        pytest.param(Coords(latitude=43.6453, longitude=-79.3806), None, id="geo"),
+        pytest.param(Coords(latitude=43.6453, longitude=-79.3806), "pizza", id="both"),
+    ],
+)
+@pytest.mark.parametrize("limit", [None, 1, 2, 10])
+@pytest.mark.parametrize(
+    "with_name_index",
+    [pytest.param(True, id="name_index"), pytest.param(False, id="full_scan")],
+)
+def test_get_relevant_establishments(
+    coords: Optional[Coords],
+    search_term: Optional[str],
+    limit: Optional[int],
+    with_name_index: bool,
+):
+    index = build_establishment_index(ESTABLISHMENTS, with_name_index=with_name_index)
+    actual = get_relevant_establishments(
+        index=index, coords=coords, search_term=search_term, limit=limit
+    )
+    name_candidates = None
+    if with_name_index and search_term is not None:
+        rows = index.name_index.get_candidate_rows(search_term)
+        name_candidates = set(rows.tolist()) if rows is not None else None
+    expected = get_expected_ranking(
+        coords=coords, search_term=search_term, name_candidates=name_candidates
+    )
+    assert actual == expected[:limit]
+
+
+@pytest.mark.parametrize("search_term", ["golden dragon", "pizza", "hortons"])
+def test_get_relevant_establishments_name_index_synthetic(tmp_path, search_term: str):
+    # many name candidates, which are normalized among themselves
+    establishments = list(
+        get_establishments_from_xml(
+            write_synthetic_xml(str(tmp_path / "synthetic.xml"), n=300), workers=1
+        ).values()
+    )
+    index = build_establishment_index(establishments)
+    name_candidates = index.name_index.get_candidate_rows(search_term)
+    assert 1 < len(name_candidates) < len(index)
+    coords = Coords(latitude=43.6453, longitude=-79.3806)
+    actual = get_relevant_establishments(
+        index=index, coords=coords, search_term=search_term
+    )
+    expected = get_expected_ranking(
+        coords=coords,
+        search_term=search_term,
+        name_candidates=set(name_candidates.tolist()),
+        establishments=establishments,
+    )
+    assert actual == expected
+
+
+@pytest.mark.parametrize("k", [0, 1, 5, 50, 99, 100, 200])
+def test_get_top_k_rows(k: int):
+    # lots of ties, which must come out in row order like a stable sort
+    scores = np.random.default_rng(0).integers(0, 10, size=100).astype(float)
+    expected = np.argsort(scores, kind="stable")[:k]
+    np.testing.assert_array_equal(get_top_k_rows(scores=scores, k=k), expected)
+
+
+@pytest.mark.parametrize("radius_km", [0.0, 5.0, 15.0, 100.0])
+def test_get_relevant_establishments_radius(radius_km: float):
+    index = build_establishment_index(ESTABLISHMENTS)
+    coords = Coords(latitude=43.6453, longitude=-79.3806)
+    actual = get_relevant_establishments(
+        index=index, coords=coords, search_term="pizza", radius_km=radius_km
+    )
+    assert sorted(e.id for e in actual) == sorted(
+        index.ids[index.geo_index.within_radius(coords=coords, km=radius_km)]
+    )
+    if len(actual) == len(index):
+        assert actual == get_relevant_establishments(
+            index=index, coords=coords, search_term="pizza"
+        )
+
+
+def test_get_relevant_establishments_name_index():
+    index = build_establishment_index(ESTABLISHMENTS)
+    actual = get_relevant_establishments(index=index, search_term="hashtag india")
+    assert actual[0].name == "# HASHTAG INDIA RESTAURANT"
+    assert len(actual) == len(index)
+
+
+def get_dataset(path_to_xml: str) -> Dataset:
+    establishments = get_establishments_from_xml(path_to_xml)
+    return Dataset(
+        path_to_xml=path_to_xml,
+        establishments=establishments,
+        index=build_establishment_index(list(establishments.values())),
+    )
+
+
+def test_search_cache():
+    dataset = get_dataset("tests/test_data/dinesafe/1001.11.xml")
+    cache = SearchCache(grid_degrees=0.001)
+    coords = Coords(latitude=43.6453, longitude=-79.3806)
+    nearby_coords = Coords(latitude=43.64531, longitude=-79.38059)
+
+    results = cache.get_relevant_establishments(
+        dataset=dataset, coords=coords, search_term="Pizza", limit=5
+    )
+    assert results == get_relevant_establishments(
+        index=dataset.index,
+        coords=cache.get_quantized_coords(coords),
+        search_term="pizza",
+        limit=5,
+    )
+    # normalized term and quantized coords share the entry
+    assert (
+        cache.get_relevant_establishments(
+            dataset=dataset, coords=nearby_coords, search_term=" PIZZA! ", limit=5
+        )
+        == results
+    )
+    assert (cache.stats.hits, cache.stats.misses) == (1, 1)
+    cache.get_relevant_establishments(dataset=dataset, coords=coords, limit=5)
+    assert (cache.stats.hits, cache.stats.misses) == (1, 2)
+    assert len(cache) == 2
+
+    # a new dataset version invalidates everything
+    new_dataset = get_dataset("tests/test_data/dinesafe/1000.01.xml")
+    cache.get_relevant_establishments(
+        dataset=new_dataset, coords=coords, search_term="pizza", limit=5
+    )
+    assert (cache.stats.hits, cache.stats.misses) == (1, 3)
+    assert len(cache) == 1
+
+
+def test_search_cache_eviction_and_ttl():
+    dataset = get_dataset("tests/test_data/dinesafe/1001.11.xml")
+    cache = SearchCache(max_entries=2)
+    for search_term in ["a", "b", "c"]:
+        cache.get_relevant_establishments(dataset=dataset, search_term=search_term)
+    assert len(cache) == 2
+    cache.get_relevant_establishments(dataset=dataset, search_term="a")
+    assert cache.stats.hits == 0
+
+    cache = SearchCache(ttl_seconds=0)
+    cache.get_relevant_establishments(dataset=dataset, search_term="a")
+    cache.get_relevant_establishments(dataset=dataset, search_term="a")
+    assert cache.stats.hits == 0
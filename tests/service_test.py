@@ -0,0 +1,165 @@
+import asyncio
+import http.client
+import json
+import shutil
+import socket
+import threading
+
+import pytest
+
+from dinesafe import service
+from dinesafe.dataset import DatasetStore, load_dataset
+from dinesafe.service import SearchService, start_server
+
+TEST_XML = "tests/test_data/dinesafe/1000.01.xml"
+
+
+@pytest.fixture
+def api_port(tmp_path):
+    dataset_store = DatasetStore(load_dataset(shutil.copy(TEST_XML, tmp_path)))
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(
+        start_server(SearchService(dataset_store), host="127.0.0.1", port=0)
+    )
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield server.sockets[0].getsockname()[1]
+
+    async def shutdown():
+        # including handlers still waiting on kept alive connections
+        server.close()
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    asyncio.run_coroutine_threadsafe(shutdown(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def get_json(conn: http.client.HTTPConnection, url: str, headers: dict = {}):
+    conn.request("GET", url, headers=headers)
+    response = conn.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def test_search_and_detail_over_one_connection(api_port):
+    conn = http.client.HTTPConnection("127.0.0.1", api_port)
+    status, results = get_json(conn, "/search?search_term=pizza&limit=3")
+    assert status == 200
+    assert 0 < len(results) <= 3
+    status, detail = get_json(conn, f"/establishments/{results[0]['id']}")
+    assert status == 200
+    assert detail["name"] == results[0]["name"]
+    assert "inspections" in detail
+    status, results = get_json(
+        conn, "/search?latitude=43.6453&longitude=-79.3806&radius_km=2&limit=5"
+    )
+    assert status == 200
+    assert len(results) <= 5
+    status, results = get_json(conn, "/search?failed=true&inspected_since=2000-01-01")
+    assert status == 200
+    assert all(d["latest_status"].lower() != "pass" for d in results)
+    conn.close()
+
+
+@pytest.mark.parametrize(
+    ("url", "expected_status"),
+    [
+        pytest.param("/search?limit=0", 400, id="bad_limit"),
+        pytest.param("/search?latitude=43", 400, id="latitude_only"),
+        pytest.param("/search?radius_km=abc", 400, id="bad_radius"),
+        pytest.param("/search?radius_km=nan", 400, id="nan_radius"),
+        pytest.param("/search?limit=inf", 400, id="inf_limit"),
+        pytest.param("/search?limit=nan", 400, id="nan_limit"),
+        pytest.param("/search?latitude=-inf&longitude=0", 400, id="inf_latitude"),
+        pytest.param("/search?inspected_since=yesterday", 400, id="bad_date"),
+        pytest.param("/establishments/missing", 404, id="missing_establishment"),
+        pytest.param("/nowhere", 404, id="missing_route"),
+    ],
+)
+def test_errors(api_port, url, expected_status):
+    conn = http.client.HTTPConnection("127.0.0.1", api_port)
+    status, d = get_json(conn, url)
+    assert status == expected_status
+    assert "error" in d
+    # connection is still usable after an error
+    assert get_json(conn, "/health")[0] == 200
+    conn.close()
+
+
+def test_internal_error(api_port, monkeypatch):
+    def get_establishment_dict(*args, **kwargs):
+        raise RuntimeError("oops")
+
+    conn = http.client.HTTPConnection("127.0.0.1", api_port)
+    establishment_id = get_json(conn, "/search?limit=1")[1][0]["id"]
+    monkeypatch.setattr(service, "get_establishment_dict", get_establishment_dict)
+    status, d = get_json(conn, f"/establishments/{establishment_id}")
+    assert status == 500
+    assert "error" in d
+    conn.close()
+    # streamed responses can only be cut short
+    conn = http.client.HTTPConnection("127.0.0.1", api_port)
+    with pytest.raises(http.client.IncompleteRead):
+        get_json(conn, "/search?limit=1")
+    conn.close()
+    # the server itself keeps going
+    monkeypatch.undo()
+    conn = http.client.HTTPConnection("127.0.0.1", api_port)
+    assert get_json(conn, "/health")[0] == 200
+    conn.close()
+
+
+def test_api_key(api_port, monkeypatch):
+    monkeypatch.setattr(service, "API_KEY", "secret")
+    conn = http.client.HTTPConnection("127.0.0.1", api_port)
+    assert get_json(conn, "/health")[0] == 401
+    assert get_json(conn, "/health", headers={"X-API-Key": "secret"})[0] == 200
+    assert get_json(conn, "/health", headers={"X-API-Key": "secreu"})[0] == 401
+    conn.close()
+
+
+def test_slow_request(api_port, monkeypatch):
+    monkeypatch.setattr(service, "REQUEST_SECONDS", 0.1)
+    with socket.create_connection(("127.0.0.1", api_port)) as sock:
+        sock.sendall(b"GET /health HTTP/1.1\r\nHost: x\r\n")
+        # never finishes the headers, so it's dropped rather than waited on
+        sock.settimeout(5.0)
+        assert sock.recv(1024) == b""
+
+
+def test_refresh_periodically_after_failure(tmp_path, monkeypatch):
+    dataset_store = DatasetStore(load_dataset(shutil.copy(TEST_XML, tmp_path)))
+    num_refreshes = 0
+
+    def refresh(path_to_xml):
+        nonlocal num_refreshes
+        num_refreshes += 1
+        raise RuntimeError("oops")
+
+    monkeypatch.setattr(dataset_store, "refresh", refresh)
+
+    async def refresh_for_a_while():
+        task = asyncio.ensure_future(
+            SearchService(dataset_store).refresh_periodically(refresh_seconds=0.01)
+        )
+        await asyncio.sleep(0.2)
+        # still going
+        assert not task.done()
+        task.cancel()
+
+    asyncio.run(refresh_for_a_while())
+    assert num_refreshes > 1
+
+
+def test_metrics(api_port):
+    conn = http.client.HTTPConnection("127.0.0.1", api_port)
+    conn.request("GET", "/metrics")
+    response = conn.getresponse()
+    assert response.status == 200
+    assert response.getheader("Content-Type").startswith("text/plain")
+    assert b"# TYPE dinesafe_stage_seconds summary" in response.read()
+    conn.close()
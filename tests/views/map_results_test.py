@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from benchmarks.synthetic import write_synthetic_xml
+from dinesafe.data.parsed import get_establishments_from_xml
+from dinesafe.index import build_establishment_index
+from views.map_results import get_geojson
+
+ESTABLISHMENTS = list(
+    get_establishments_from_xml("tests/test_data/dinesafe/1001.11.xml").values()
+)
+INDEX = build_establishment_index(ESTABLISHMENTS)
+
+
+@pytest.mark.parametrize(
+    ("ranked",),
+    [pytest.param(True, id="ranked"), pytest.param(False, id="clustered")],
+)
+def test_get_geojson(ranked: bool):
+    rows = [2, 0]
+    geojson = get_geojson(INDEX, rows, ranked=ranked)
+    # has to survive the trip to the browser
+    assert json.loads(json.dumps(geojson)) == geojson
+    assert len(geojson["features"]) == len(rows)
+    for i, (row, feature) in enumerate(zip(rows, geojson["features"])):
+        e = ESTABLISHMENTS[row]
+        longitude, latitude = feature["geometry"]["coordinates"]
+        assert latitude == pytest.approx(e.latitude, abs=1e-5)
+        assert longitude == pytest.approx(e.longitude, abs=1e-5)
+        properties = feature["properties"]
+        assert properties["name"] == e.name
+        is_pass = e.passed_most_recent_inspection
+        assert properties["status"] == (
+            "unknown" if is_pass is None else ("pass" if is_pass else "fail")
+        )
+        assert properties.get("rank") == (i + 1 if ranked else None)
+
+
+def test_get_geojson_failed_rows(tmp_path):
+    path_to_xml = write_synthetic_xml(str(tmp_path / "synthetic.xml"), n=200)
+    index = build_establishment_index(
+        get_establishments_from_xml(path_to_xml, workers=1).values()
+    )
+    failed_rows = index.get_failed_rows()
+    assert len(failed_rows) > 0
+    geojson = get_geojson(index, failed_rows, ranked=False)
+    assert len(geojson["features"]) == len(failed_rows)
+    assert all(f["properties"]["status"] == "fail" for f in geojson["features"])
+
+
+def test_get_geojson_blank_status():
+    index = build_establishment_index(
+        get_establishments_from_xml("tests/test_data/blank_fields.xml").values()
+    )
+    geojson = get_geojson(index, [index.rows_by_id["1"], index.rows_by_id["2"]])
+    assert [f["properties"]["status"] for f in geojson["features"]] == ["fail", "pass"]
@@ -0,0 +1,63 @@
+from dinesafe.yelp_cache import YelpCache
+
+DETAILS = {"id": "biz_0", "rating": 4.5, "review_count": 10, "url": "url_0"}
+
+
+def test_yelp_cache(tmp_path):
+    cache = YelpCache(path=tmp_path / "yelp_cache.sqlite")
+    assert cache.get("DinesafeTO_0") is None
+
+    cache.put("DinesafeTO_0", details=DETAILS)
+    cache.put("DinesafeTO_1", details=None)
+    entry = cache.get("DinesafeTO_0")
+    assert entry.biz_id == "biz_0" and entry.details == DETAILS
+    assert cache.is_mapping_fresh(entry) and cache.is_details_fresh(entry)
+    entry = cache.get("DinesafeTO_1")
+    assert entry.biz_id is None and entry.details is None
+    assert cache.is_mapping_fresh(entry) and not cache.is_details_fresh(entry)
+
+    # persisted
+    assert YelpCache(path=tmp_path / "yelp_cache.sqlite").get(
+        "DinesafeTO_0"
+    ) == cache.get("DinesafeTO_0")
+
+
+def test_yelp_cache_ttls(tmp_path):
+    cache = YelpCache(
+        path=tmp_path / "yelp_cache.sqlite",
+        mapping_ttl_seconds=60,
+        no_match_ttl_seconds=0,
+        details_ttl_seconds=0,
+    )
+    cache.put("DinesafeTO_0", details=DETAILS)
+    cache.put("DinesafeTO_1", details=None)
+    entry = cache.get("DinesafeTO_0")
+    assert cache.is_mapping_fresh(entry) and not cache.is_details_fresh(entry)
+    assert not cache.is_mapping_fresh(cache.get("DinesafeTO_1"))
+
+    cache.put_details("DinesafeTO_0", details={**DETAILS, "review_count": 11})
+    assert cache.get("DinesafeTO_0").details["review_count"] == 11
+
+
+def test_yelp_cache_evicts_least_recently_used(tmp_path):
+    cache = YelpCache(path=tmp_path / "yelp_cache.sqlite", max_entries=2)
+    cache.put("DinesafeTO_0", details=DETAILS)
+    cache.put("DinesafeTO_1", details=DETAILS)
+    cache.get("DinesafeTO_0")
+    cache.put("DinesafeTO_2", details=DETAILS)
+    assert len(cache) == 2
+    assert cache.get("DinesafeTO_1") is None
+    assert cache.get("DinesafeTO_0") is not None
+
+
+def test_yelp_cache_peek_is_not_an_access(tmp_path):
+    cache = YelpCache(path=tmp_path / "yelp_cache.sqlite", max_entries=2)
+    cache.put("DinesafeTO_0", details=DETAILS)
+    cache.put("DinesafeTO_1", details=DETAILS)
+    assert cache.peek("DinesafeTO_0") == cache.peek("DinesafeTO_0")
+    assert cache.peek("DinesafeTO_0").details == DETAILS
+    assert cache.peek("DinesafeTO_2") is None
+    cache.put("DinesafeTO_2", details=DETAILS)
+    # still the least recently used
+    assert cache.peek("DinesafeTO_0") is None
+    assert cache.peek("DinesafeTO_1") is not None
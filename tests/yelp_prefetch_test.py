@@ -0,0 +1,38 @@
+from dinesafe import yelp
+from dinesafe.data.parsed import get_establishments_from_xml
+from dinesafe.dataset import Dataset
+from dinesafe.index import build_establishment_index
+from dinesafe.yelp_cache import YelpCache
+from dinesafe.yelp_prefetch import get_prefetch_establishments, warm_yelp_cache
+
+PATH_TO_XML = "tests/test_data/dinesafe/1001.11.xml"
+ESTABLISHMENTS = get_establishments_from_xml(PATH_TO_XML)
+DATASET = Dataset(
+    path_to_xml=PATH_TO_XML,
+    establishments=ESTABLISHMENTS,
+    index=build_establishment_index(ESTABLISHMENTS.values()),
+)
+
+
+def test_get_prefetch_establishments():
+    establishments = get_prefetch_establishments(DATASET)
+    assert sorted(e.id for e in establishments) == sorted(DATASET.establishments)
+
+
+def test_warm_yelp_cache(fake_yelp, tmp_path):
+    cache = YelpCache(path=tmp_path / "yelp_cache.sqlite")
+    assert warm_yelp_cache(dataset=DATASET, budget=2, cache=cache) == 2
+    assert fake_yelp.num_requests == 2
+    # only what's left over, and nothing once everything is warm
+    assert warm_yelp_cache(dataset=DATASET, budget=2, cache=cache) == 1
+    assert warm_yelp_cache(dataset=DATASET, budget=2, cache=cache) == 0
+    assert fake_yelp.num_requests == 3
+    for e in DATASET.establishments.values():
+        assert cache.is_fresh(cache.get(e.external_id))
+
+
+def test_warm_yelp_cache_without_api_key(fake_yelp, tmp_path, monkeypatch):
+    monkeypatch.setattr(yelp, "YELP_API_KEY", None)
+    cache = YelpCache(path=tmp_path / "yelp_cache.sqlite")
+    assert warm_yelp_cache(dataset=DATASET, budget=2, cache=cache) == 0
+    assert fake_yelp.num_requests == 0 and len(cache) == 0
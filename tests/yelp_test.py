@@ -1,5 +1,19 @@
+import time
+from dataclasses import replace
+
+from dinesafe import yelp
 from dinesafe.data.parsed import get_establishments_from_xml
-from dinesafe.yelp import get_yelp_biz_search_top_result
+from dinesafe.yelp import (
+    get_yelp_biz_search_top_result,
+    get_yelp_biz_search_top_results,
+    get_yelp_business,
+    get_yelp_businesses,
+)
+from dinesafe.yelp_cache import YelpCache
+
+ESTABLISHMENTS = list(
+    get_establishments_from_xml("tests/test_data/dinesafe/1001.11.xml").values()
+)
 
 
 def test_get_yelp_biz_search_result():
@@ -9,3 +23,54 @@ def test_get_yelp_biz_search_result():
         yelp_biz_result = get_yelp_biz_search_top_result(establishment=e)
         assert yelp_biz_result is not None
         break
+
+
+def test_get_yelp_biz_search_top_results(fake_yelp, monkeypatch):
+    monkeypatch.setattr(yelp, "MAX_WORKERS", 2)
+    establishments = ESTABLISHMENTS * 3
+    results = get_yelp_biz_search_top_results(establishments=establishments)
+    assert [d["id"] for d in results] == [f"id {e.name}" for e in establishments]
+    assert fake_yelp.max_active == 2
+
+
+def test_get_yelp_biz_search_top_result_rate_limited(fake_yelp):
+    fake_yelp.num_rate_limited = 2
+    d = get_yelp_biz_search_top_result(establishment=ESTABLISHMENTS[0])
+    assert d["id"] == f"id {ESTABLISHMENTS[0].name}"
+    assert fake_yelp.num_requests == 3
+
+
+def test_get_yelp_biz_search_top_result_rate_limited_too_long(fake_yelp):
+    # not slept through
+    fake_yelp.num_rate_limited, fake_yelp.retry_after = 1, "3600"
+    start = time.monotonic()
+    assert get_yelp_biz_search_top_result(establishment=ESTABLISHMENTS[0]) is None
+    assert time.monotonic() - start < yelp.MAX_BACKOFF_SECONDS
+    assert fake_yelp.num_requests == 1
+
+
+def test_get_yelp_businesses(fake_yelp, tmp_path):
+    cache = YelpCache(path=tmp_path / "yelp_cache.sqlite")
+    missing = replace(ESTABLISHMENTS[0], id="missing", name="missing")
+    establishments = ESTABLISHMENTS + [missing]
+    expected = [f"id {e.name}" for e in ESTABLISHMENTS] + [None]
+
+    results = get_yelp_businesses(establishments=establishments, cache=cache)
+    assert [d["id"] if d is not None else None for d in results] == expected
+    assert fake_yelp.num_requests == len(establishments)
+
+    # all cached, including the missing one
+    results = get_yelp_businesses(establishments=establishments, cache=cache)
+    assert [d["id"] if d is not None else None for d in results] == expected
+    assert fake_yelp.num_requests == len(establishments)
+
+
+def test_get_yelp_business_stale_details(fake_yelp, tmp_path):
+    cache = YelpCache(path=tmp_path / "yelp_cache.sqlite", details_ttl_seconds=0)
+    e = ESTABLISHMENTS[0]
+    assert get_yelp_business(establishment=e, cache=cache)["review_count"] == 10
+
+    fake_yelp.get_business = lambda term: {"id": f"id {term}", "review_count": 11}
+    assert get_yelp_business(establishment=e, cache=cache)["review_count"] == 11
+    assert fake_yelp.num_requests == 2
+    assert cache.get(e.external_id).biz_id == f"id {e.name}"
@@ -1,53 +1,95 @@
-from typing import List, Optional, Tuple
+import json
+import os
+from typing import Optional, Sequence, Tuple
 
-import folium
+import numpy as np
 import streamlit as st
-from folium.map import Icon
-from streamlit_folium import folium_static
+import streamlit.components.v1 as components
 
-from dinesafe.data.types import Establishment
+from dinesafe.data.columnar import MISSING_DAY
+from dinesafe.dataset import Dataset
+from dinesafe.index import EstablishmentIndex
+from dinesafe.metrics import Stage, timed
 
+MAP_HEIGHT = 500
+# e.g. the latest results of each session and the map of all failed inspections
+MAX_CACHED_MAPS = 64
 
+# a static leaflet page, loaded once per session and then sent only the features
+_map_component = components.declare_component(
+    "dinesafe_map",
+    path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "map_component"),
+)
+
+
+def get_status(latest_status: Optional[str], latest_day: int) -> str:
+    # same as Inspection.is_pass, unknown only if there are no inspections
+    if latest_day == MISSING_DAY:
+        return "unknown"
+    if latest_status is None:
+        return "fail"
+    return "pass" if latest_status.lower() == "pass" else "fail"
+
+
+def get_geojson(
+    index: EstablishmentIndex, rows: Sequence[int], ranked: bool = True
+) -> dict:
+    # straight from the index columns, without going through each establishment
+    rows = np.asarray(rows, dtype=np.intp)
+    latitudes = np.degrees(index.latitudes[rows]).round(5).tolist()
+    longitudes = np.degrees(index.longitudes[rows]).round(5).tolist()
+    features = []
+    for i, row in enumerate(rows.tolist()):
+        properties = {
+            "name": index.names[row],
+            "status": get_status(index.latest_statuses[row], index.latest_days[row]),
+        }
+        if ranked:
+            properties["rank"] = i + 1
+        features.append(
+            {
+                "type": "Feature",
+                "geometry": {
+                    "type": "Point",
+                    "coordinates": [longitudes[i], latitudes[i]],
+                },
+                "properties": properties,
+            }
+        )
+    return {"type": "FeatureCollection", "features": features}
+
+
+@st.cache_resource(max_entries=MAX_CACHED_MAPS, show_spinner=False)
+def get_geojson_payload(
+    version: str, rows: np.ndarray, ranked: bool, _index: EstablishmentIndex
+) -> str:
+    # rows are the same establishments within a version, so the index isn't hashed
+    return json.dumps(get_geojson(_index, rows, ranked=ranked), separators=(",", ":"))
+
+
+@timed("views.map_results")
 def map_results(
-    most_relevant: List[Establishment],
+    dataset: Dataset,
+    rows: Sequence[int],
     center_loc: Optional[Tuple[float, float]] = None,
     n_limit_bounds: Optional[int] = 1,
+    cluster: bool = False,
 ):
-    m = folium.Map(location=center_loc, control_scale=True)
-    if center_loc is not None:
-        folium.Marker(
-            location=center_loc,
-            tooltip="Current location",
-            icon=Icon(color="blue"),
-        ).add_to(m)
-
-    estab_lat_lons = []
-    for i, establishment in enumerate(most_relevant):
-        is_pass = establishment.passed_most_recent_inspection
-        icon = str(i + 1) if i < 9 else "circle"
-        color = "orange" if is_pass is None else ("green" if is_pass else "red")
-        status = "unknown" if is_pass is None else ("pass" if is_pass else "fail")
-
-        folium.Marker(
-            location=[establishment.latitude, establishment.longitude],
-            tooltip=f"{establishment.name} ({status})",
-            icon=Icon(icon=icon, color=color, prefix="fa"),
-        ).add_to(m)
-        estab_lat_lons.append((establishment.latitude, establishment.longitude))
-
-    # fit center and first n_limit_bounds establishments
-    m.fit_bounds(
-        bounds=[
-            center_loc,
-        ]
-        + estab_lat_lons[:n_limit_bounds]
+    # clustered maps have too many markers to label them by rank
+    with Stage("views.map_geojson"):
+        geojson = get_geojson_payload(
+            version=dataset.version,
+            rows=np.asarray(rows, dtype=np.intp),
+            ranked=not cluster,
+            _index=dataset.index,
+        )
+    # a fixed key keeps the same map across reruns instead of reloading it
+    _map_component(
+        geojson=geojson,
+        center=list(center_loc) if center_loc is not None else None,
+        n_limit_bounds=n_limit_bounds,
+        cluster=cluster,
+        height=MAP_HEIGHT,
+        key="results_map",
+        default=None,
     )
-
-    # https://github.com/randyzwitch/streamlit-folium/issues/7
-    make_map_responsive = """
-        <style>
-        [title~="st.iframe"] { width: 100%}
-        </style>
-        """
-    st.markdown(make_map_responsive, unsafe_allow_html=True)
-    folium_static(m, width=500, height=500)
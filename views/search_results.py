@@ -1,10 +1,11 @@
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 
 import streamlit as st
 
-from dinesafe.data.types import Establishment, Inspection
-from views.yelp_ratings import get_formatted_yelp_business_rating
+from dinesafe.data.types import Establishment, Inspection, InspectionSummary
+from dinesafe.metrics import timed
+from views.yelp_ratings import get_formatted_yelp_business_ratings
 
 
 def get_dt_str(dt: datetime) -> str:
@@ -40,33 +41,36 @@ establishment_md_str = """
 """
 
 
+def get_establishment_md(rank: int, establishment: Establishment) -> str:
+    return establishment_md_str.format(
+        rank=rank,
+        name=establishment.name,
+        address=establishment.address,
+        lat=establishment.latitude,
+        lon=establishment.longitude,
+    )
+
+
+def get_inspections_summary_md(summary: InspectionSummary) -> Optional[str]:
+    if summary.num_inspections == 0:
+        return None
+    return (
+        f"Past {summary.num_inspections} inspections "
+        + f"({100*summary.pass_proportion:.0f}% pass rate). "
+        + "Most recent first: "
+        + "".join(["✅" if is_pass else "❌" for is_pass in summary.pass_sequence])
+    )
+
+
+@timed("views.search_results")
 def search_results(most_relevant: List[Establishment]):
-    for i, establishment in enumerate(most_relevant):
-        st.markdown(
-            establishment_md_str.format(
-                rank=i + 1,
-                name=establishment.name,
-                address=establishment.address,
-                lat=establishment.latitude,
-                lon=establishment.longitude,
-            )
-        )
-        inspections = establishment.inspections_latest_first
-        if len(inspections) > 0:
-            show_latest_inspection_results(inspection=inspections[0])
-            pass_proportion = sum(
-                [1 if inspection.is_pass else 0 for inspection in inspections]
-            ) / len(inspections)
-            st.markdown(
-                f"Past {len(inspections)} inspections "
-                + f"({100*pass_proportion:.0f}% pass rate). "
-                + "Most recent first: "
-                + "".join(
-                    ["✅" if inspection.is_pass else "❌" for inspection in inspections]
-                )
-            )
-        st.markdown(
-            get_formatted_yelp_business_rating(establishment=establishment),
-            unsafe_allow_html=True,
-        )
+    yelp_ratings = get_formatted_yelp_business_ratings(establishments=most_relevant)
+    for i, (establishment, yelp_rating) in enumerate(zip(most_relevant, yelp_ratings)):
+        st.markdown(get_establishment_md(rank=i + 1, establishment=establishment))
+        summary = establishment.summary
+        inspections_summary_md = get_inspections_summary_md(summary)
+        if inspections_summary_md is not None:
+            show_latest_inspection_results(inspection=summary.latest_inspection)
+            st.markdown(inspections_summary_md)
+        st.markdown(yelp_rating, unsafe_allow_html=True)
         st.markdown("----")
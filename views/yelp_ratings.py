@@ -1,5 +1,8 @@
+from typing import List, Optional
+
 from dinesafe.data.types import Establishment
-from dinesafe.yelp import get_yelp_biz_search_top_result
+from dinesafe.metrics import timed
+from dinesafe.yelp import get_yelp_business, get_yelp_businesses
 
 rating_to_stars_url_mapping = {
     0.0: "https://raw.githubusercontent.com/tianle91/dinesafe/main/assets/yelp_stars/regular_0.png",
@@ -22,8 +25,7 @@ Based on {num_reviews} reviews.
 """
 
 
-def get_formatted_yelp_business_rating(establishment: Establishment) -> str:
-    d = get_yelp_biz_search_top_result(establishment=establishment)
+def format_yelp_business_rating(d: Optional[dict]) -> str:
     if d is not None:
         return yelp_business_md_template.format(
             num_stars=d["rating"],
@@ -32,3 +34,18 @@ def get_formatted_yelp_business_rating(establishment: Establishment) -> str:
             yelp_biz_page_url=d["url"],
         )
     return ""
+
+
+def get_formatted_yelp_business_rating(establishment: Establishment) -> str:
+    return format_yelp_business_rating(get_yelp_business(establishment=establishment))
+
+
+@timed("views.yelp_ratings")
+def get_formatted_yelp_business_ratings(
+    establishments: List[Establishment],
+) -> List[str]:
+    # fetched concurrently through the yelp cache, in the same order as establishments
+    return [
+        format_yelp_business_rating(d)
+        for d in get_yelp_businesses(establishments=establishments)
+    ]